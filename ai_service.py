@@ -4,32 +4,55 @@ Service IA pour la détection d'anomalies et la prédiction des zones à haut ri
 Application de gestion des catastrophes - Algérie
 """
 
+import time
+
+# Début du chargement du module (mesure du temps de démarrage)
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import sys
+import gc
+import bisect
+import copy
+import functools
 import json
+import hashlib
+import shutil
+import uuid
+import multiprocessing
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
-from sklearn.cluster import DBSCAN, KMeans
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, List, Dict, Tuple, Optional
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
 import joblib
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pymongo
 from pymongo import MongoClient
 import redis
 import threading
-import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import fcntl  # Verrous inter-processus (serveur pré-fork)
+except ImportError:
+    fcntl = None
+
+# pandas et scikit-learn sont importés à la demande (démarrage rapide)
+if TYPE_CHECKING:
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
 @dataclass
 class IncidentData:
     """Structure de données pour un incident"""
@@ -52,221 +75,2980 @@ class RiskPrediction:
     confidence: float
     factors: List[str]
 
+# Rayon terrestre moyen (mètres) pour les calculs de distance
+EARTH_RADIUS_M = 6371000.0
+
+# Codes numériques des catégories d'incidents
+CATEGORY_CODES = {
+    'earthquake': 1, 'flood': 2, 'fire': 3, 'storm': 4,
+    'landslide': 5, 'accident': 6, 'infrastructure': 7,
+    'health': 8, 'security': 9, 'other': 10
+}
+CATEGORY_NAMES = np.array(['other'] + list(CATEGORY_CODES.keys()), dtype=object)
+
+def parse_timestamps(values: List[str]) -> np.ndarray:
+    """Convertir des dates ISO 8601 en tableau datetime64[ms] (UTC)"""
+    if len(values) == 0:
+        return np.empty(0, dtype='datetime64[ms]')
+    import pandas as pd
+    parsed = pd.to_datetime(pd.Series(values), format='ISO8601', utc=True)
+    return parsed.dt.tz_localize(None).to_numpy(dtype='datetime64[ms]')
+
+def normalize_timestamp(value) -> str:
+    """Normaliser une date ISO 8601 en UTC explicite (suffixe Z), au ms (ValueError si invalide)"""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed.isoformat(timespec='milliseconds') + 'Z'
+    
+    # Formes ISO 8601 que fromisoformat ne lit pas : même analyse que pour les lots
+    try:
+        parsed = parse_timestamps([value])[0]
+    except (TypeError, ValueError):
+        parsed = np.datetime64('NaT')
+    if np.isnat(parsed):
+        raise ValueError(f"date invalide (ISO 8601 attendu): {value!r}")
+    return str(parsed) + 'Z'
+
+INCIDENT_RECORD_FIELDS = ('id', 'latitude', 'longitude', 'category', 'severity', 'timestamp')
+
+def validate_incident_record(record) -> Dict:
+    """Vérifier un incident JSON de l'API avant sa mise en lot (ValueError si invalide)"""
+    if not isinstance(record, dict):
+        raise ValueError("objet JSON attendu")
+    missing = [name for name in INCIDENT_RECORD_FIELDS if name not in record]
+    if missing:
+        raise ValueError(f"champs manquants: {', '.join(missing)}")
+    try:
+        latitude, longitude, severity = (float(record[name]) for name in ('latitude', 'longitude', 'severity'))
+    except (TypeError, ValueError):
+        raise ValueError("latitude, longitude et severity doivent être numériques") from None
+    if not (np.isfinite(latitude) and np.isfinite(longitude)) or not -128 <= severity <= 127:
+        raise ValueError("coordonnées ou gravité hors limites")
+    return dict(record, timestamp=normalize_timestamp(record['timestamp']))
+
+# Format binaire des endpoints de masse : MessagePack, une colonne par champ
+# (valeurs numériques en octets little-endian, chaînes en listes)
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+def column_from_wire(value, dtype) -> np.ndarray:
+    """Décoder une colonne binaire (octets little-endian) ou une liste"""
+    dtype = np.dtype(dtype)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=dtype.newbyteorder('<')).astype(dtype, copy=False)
+    return np.asarray(value, dtype=dtype)
+
+def column_to_wire(values: np.ndarray, dtype) -> bytes:
+    """Encoder une colonne numérique en octets little-endian"""
+    return np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+
+@dataclass
+class IncidentBatch:
+    """Lot d'incidents au format colonnaire (un tableau NumPy par champ)"""
+    ids: np.ndarray                   # object
+    latitudes: np.ndarray             # float64
+    longitudes: np.ndarray            # float64
+    categories: np.ndarray            # int8 (codes de CATEGORY_CODES)
+    severities: np.ndarray            # int8
+    timestamps: np.ndarray            # datetime64[ms]
+    temperatures: np.ndarray          # float64, NaN si inconnue
+    humidities: np.ndarray            # float64, NaN si inconnue
+    wind_speeds: np.ndarray           # float64, NaN si inconnue
+    population_densities: np.ndarray  # float64, NaN si inconnue
+    
+    def __len__(self) -> int:
+        return len(self.latitudes)
+    
+    @classmethod
+    def empty(cls, size: int = 0) -> 'IncidentBatch':
+        """Créer un lot préalloué de taille donnée"""
+        return cls(
+            ids=np.empty(size, dtype=object),
+            latitudes=np.empty(size, dtype=np.float64),
+            longitudes=np.empty(size, dtype=np.float64),
+            categories=np.full(size, 10, dtype=np.int8),
+            severities=np.empty(size, dtype=np.int8),
+            timestamps=np.empty(size, dtype='datetime64[ms]'),
+            temperatures=np.full(size, np.nan),
+            humidities=np.full(size, np.nan),
+            wind_speeds=np.full(size, np.nan),
+            population_densities=np.full(size, np.nan)
+        )
+    
+    @classmethod
+    def from_incidents(cls, incidents: List[IncidentData]) -> 'IncidentBatch':
+        """Construire un lot à partir d'objets IncidentData"""
+        batch = cls.empty(len(incidents))
+        for i, incident in enumerate(incidents):
+            batch.ids[i] = incident.id
+            batch.latitudes[i] = incident.latitude
+            batch.longitudes[i] = incident.longitude
+            batch.categories[i] = CATEGORY_CODES.get(incident.category, 10)
+            batch.severities[i] = incident.severity
+            batch.timestamps[i] = np.datetime64(incident.timestamp, 'ms')
+            weather = incident.weather_conditions or {}
+            batch.temperatures[i] = weather.get('temperature', np.nan)
+            batch.humidities[i] = weather.get('humidity', np.nan)
+            batch.wind_speeds[i] = weather.get('windSpeed', np.nan)
+            if incident.population_density:
+                batch.population_densities[i] = incident.population_density
+        return batch
+    
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'IncidentBatch':
+        """Construire un lot à partir des incidents JSON reçus par l'API"""
+        size = len(records)
+        batch = cls.empty(size)
+        batch.ids[:] = [record['id'] for record in records]
+        batch.latitudes[:] = np.fromiter((record['latitude'] for record in records), np.float64, size)
+        batch.longitudes[:] = np.fromiter((record['longitude'] for record in records), np.float64, size)
+        batch.categories[:] = np.fromiter(
+            (CATEGORY_CODES.get(record['category'], 10) for record in records), np.int8, size
+        )
+        batch.severities[:] = np.fromiter((record['severity'] for record in records), np.int8, size)
+        batch.timestamps[:] = parse_timestamps([record['timestamp'] for record in records])
+        return batch
+    
+    @classmethod
+    def from_columns(cls, columns: Dict) -> 'IncidentBatch':
+        """Construire un lot à partir de colonnes décodées (format binaire)
+        
+        latitude/longitude : float64, severity : int8, timestamp : int64 (ms depuis
+        l'epoch) ou chaînes ISO 8601, category : codes int8 ou noms, id : liste.
+        """
+        if not columns:
+            return cls.empty(0)
+        latitudes = column_from_wire(columns['latitude'], np.float64)
+        size = len(latitudes)
+        batch = cls.empty(size)
+        batch.latitudes[:] = latitudes
+        batch.longitudes[:] = column_from_wire(columns['longitude'], np.float64)
+        batch.severities[:] = column_from_wire(columns['severity'], np.int8)
+        
+        categories = columns['category']
+        if isinstance(categories, (bytes, bytearray, memoryview)):
+            codes = column_from_wire(categories, np.int8)
+            # Codes inconnus (0 compris) : 'other' (10), comme pour les noms du format JSON
+            batch.categories[:] = np.where((codes >= 1) & (codes <= 10), codes, 10)
+        else:
+            batch.categories[:] = np.fromiter((CATEGORY_CODES.get(name, 10) for name in categories), np.int8, size)
+        
+        timestamps = columns['timestamp']
+        if isinstance(timestamps, (bytes, bytearray, memoryview)):
+            batch.timestamps[:] = column_from_wire(timestamps, np.int64).view('datetime64[ms]')
+        else:
+            batch.timestamps[:] = parse_timestamps(list(timestamps))
+        
+        ids = columns.get('id')
+        batch.ids[:] = list(ids) if ids is not None else np.arange(size).astype(str)
+        return batch
+    
+    @classmethod
+    def from_documents(cls, documents) -> 'IncidentBatch':
+        """Construire un lot à partir de documents MongoDB"""
+        documents = list(documents)
+        batch = cls.empty(len(documents))
+        batch.fill_from_documents(documents, 0)
+        return batch
+    
+    def fill_from_documents(self, documents: List[Dict], offset: int):
+        """Remplir le lot à partir de documents MongoDB, à partir d'une position"""
+        for i, doc in enumerate(documents, start=offset):
+            coordinates = doc['location']['coordinates']
+            weather = (doc.get('metadata') or {}).get('weather') or {}
+            if '_id' in doc:
+                self.ids[i] = str(doc['_id'])
+            self.latitudes[i] = coordinates[1]
+            self.longitudes[i] = coordinates[0]
+            self.categories[i] = CATEGORY_CODES.get(doc['category'], 10)
+            self.severities[i] = doc['severity']
+            self.timestamps[i] = np.datetime64(doc['createdAt'], 'ms')
+            self.temperatures[i] = weather.get('temperature', np.nan)
+            self.humidities[i] = weather.get('humidity', np.nan)
+            self.wind_speeds[i] = weather.get('windSpeed', np.nan)
+    
+    def resize(self, size: int) -> 'IncidentBatch':
+        """Retourner un lot redimensionné (tronqué ou agrandi)"""
+        if size <= len(self):
+            return self.take(slice(0, size))
+        grown = IncidentBatch.empty(size)
+        for name in self.__dataclass_fields__:
+            getattr(grown, name)[:len(self)] = getattr(self, name)
+        return grown
+    
+    @property
+    def category_names(self) -> np.ndarray:
+        """Noms des catégories de chaque incident"""
+        return CATEGORY_NAMES[self.categories]
+    
+    def take(self, positions) -> 'IncidentBatch':
+        """Extraire un sous-lot (indices ou masque booléen)"""
+        return IncidentBatch(**{name: getattr(self, name)[positions] for name in self.__dataclass_fields__})
+    
+    def digest(self) -> str:
+        """Empreinte du contenu du lot (regroupement des requêtes identiques)"""
+        digest = hashlib.blake2b(digest_size=16)
+        for name in self.__dataclass_fields__:
+            values = getattr(self, name)
+            if values.dtype == object:
+                digest.update('\x1f'.join(map(str, values)).encode())
+            else:
+                digest.update(np.ascontiguousarray(values).tobytes())
+            digest.update(b'\x1e')
+        return digest.hexdigest()
+
+# Principales villes d'Algérie (latitude, longitude, densité hab/km²)
+MAJOR_CITIES = np.array([
+    (36.7538, 3.0588, 3000),   # Alger
+    (35.6969, -0.6331, 1500),  # Oran
+    (36.3650, 6.6147, 1200),   # Constantine
+    (36.9000, 7.7667, 800),    # Annaba
+    (36.4203, 2.8277, 900),    # Blida
+    (35.5559, 6.1741, 600),    # Batna
+    (34.6714, 3.2631, 400),    # Djelfa
+    (36.1906, 5.4137, 700),    # Sétif
+    (35.1908, -0.6307, 500),   # Sidi Bel Abbès
+    (34.8481, 5.7281, 450)     # Biskra
+])
+
+# Emprise géographique de l'Algérie (avec une marge)
+ALGERIA_BOUNDS = {'lat_min': 18.5, 'lat_max': 37.6, 'lng_min': -9.0, 'lng_max': 12.5}
+
+def simulate_population_density(lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Simuler la densité de population à partir des principales villes d'Algérie"""
+    lats, lngs = np.broadcast_arrays(np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64))
+    
+    # Ville la plus proche par minimum courant des distances au carré (une passe par ville)
+    best = np.full(lats.shape, np.inf)
+    city_density = np.zeros(lats.shape)
+    for city_lat, city_lng, population in MAJOR_CITIES:
+        squared = (lats - city_lat)**2 + (lngs - city_lng)**2
+        closer = squared < best
+        best = np.where(closer, squared, best)
+        city_density = np.where(closer, population, city_density)
+    
+    # Densité de la ville la plus proche, décroissant avec la distance
+    density = city_density * np.exp(-np.sqrt(best) * 10)
+    
+    return np.maximum(density, 50)  # Minimum 50 hab/km²
+
+class PopulationDensityProvider:
+    """Raster de densité de population (hab/km²) précalculé sur l'Algérie"""
+    
+    def __init__(self, raster: np.ndarray, lat_min: float, lng_min: float, cell_size: float,
+                 default_density: float = 50.0):
+        self.raster = np.asarray(raster, dtype=np.float32)
+        self.lat_min = float(lat_min)
+        self.lng_min = float(lng_min)
+        self.cell_size = float(cell_size)
+        self.default_density = float(default_density)
+    
+    @classmethod
+    def simulated(cls, cell_size: float = 0.01) -> 'PopulationDensityProvider':
+        """Précalculer le raster à partir de la simulation par villes (densités exactes)"""
+        lat_points = np.arange(ALGERIA_BOUNDS['lat_min'], ALGERIA_BOUNDS['lat_max'] + cell_size, cell_size)
+        lng_points = np.arange(ALGERIA_BOUNDS['lng_min'], ALGERIA_BOUNDS['lng_max'] + cell_size, cell_size)
+        raster = np.full((len(lat_points), len(lng_points)), 50, dtype=np.float32)
+        
+        # Au-delà de cette distance (en degrés) de toute ville, la densité vaut le minimum
+        reach = np.log(MAJOR_CITIES[:, 2].max() / 50) / 10
+        for city_lat, city_lng, _ in MAJOR_CITIES:
+            rows = slice(*np.searchsorted(lat_points, [city_lat - reach, city_lat + reach]))
+            cols = slice(*np.searchsorted(lng_points, [city_lng - reach, city_lng + reach]))
+            raster[rows, cols] = simulate_population_density(
+                lat_points[rows, np.newaxis], lng_points[np.newaxis, cols]
+            )
+        
+        return SimulatedPopulationDensity(raster, lat_points[0], lng_points[0], cell_size)
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'PopulationDensityProvider':
+        """Charger un raster de densité (.npz : density, lat_min, lng_min, cell_size)"""
+        with np.load(path) as grid:
+            return cls(
+                grid['density'],
+                float(grid['lat_min']),
+                float(grid['lng_min']),
+                float(grid['cell_size']),
+                float(grid['default_density']) if 'default_density' in grid else 50.0
+            )
+    
+    def save(self, path: str):
+        """Sauvegarder le raster au format .npz"""
+        np.savez_compressed(
+            path, density=self.raster, lat_min=self.lat_min, lng_min=self.lng_min,
+            cell_size=self.cell_size, default_density=self.default_density
+        )
+    
+    def _inside(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        n_rows, n_cols = self.raster.shape
+        return (rows >= 0) & (rows <= n_rows - 1) & (cols >= 0) & (cols <= n_cols - 1)
+    
+    def densities(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Densités de population d'un ensemble de coordonnées (cellule la plus proche)"""
+        rows = (np.asarray(lats, dtype=np.float64) - self.lat_min) / self.cell_size
+        cols = (np.asarray(lngs, dtype=np.float64) - self.lng_min) / self.cell_size
+        inside = self._inside(rows, cols)
+        
+        # Pas d'interpolation : mélanger deux cellules voisines fausse les valeurs
+        # aux limites de zones (seuils de densité basculés)
+        n_rows, n_cols = self.raster.shape
+        rows = np.clip(np.rint(np.nan_to_num(rows)), 0, n_rows - 1).astype(np.int64)
+        cols = np.clip(np.rint(np.nan_to_num(cols)), 0, n_cols - 1).astype(np.int64)
+        return np.where(inside, self.raster[rows, cols], self.default_density)
+
+class SimulatedPopulationDensity(PopulationDensityProvider):
+    """Simulation par villes évaluée exactement (le raster ne sert qu'à l'export)"""
+    
+    def densities(self, lats: np.ndarray, lngs: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Densités exactes par diffusion sur les villes, par blocs (mémoire bornée)"""
+        lats, lngs = np.broadcast_arrays(np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64))
+        flat_lats, flat_lngs = lats.ravel(), lngs.ravel()
+        values = np.empty(len(flat_lats), dtype=np.float64)
+        for start in range(0, len(values), chunk_size):
+            values[start:start + chunk_size] = simulate_population_density(
+                flat_lats[start:start + chunk_size], flat_lngs[start:start + chunk_size]
+            )
+        
+        inside = self._inside((lats - self.lat_min) / self.cell_size, (lngs - self.lng_min) / self.cell_size)
+        return np.where(inside, values.reshape(lats.shape), self.default_density)
+
+# Champs des documents d'incidents utilisés par les modèles
+INCIDENT_PROJECTION = {
+    'location.coordinates': 1, 'category': 1, 'severity': 1,
+    'createdAt': 1, 'metadata.weather': 1
+}
+
+# Champs lus par les requêtes de proximité
+NEARBY_PROJECTION = {'location': 1, 'category': 1, 'severity': 1, 'createdAt': 1}
+
+def load_incident_batch(collection, query: Optional[Dict] = None, chunk_size: int = 5000,
+                        with_ids: bool = True,
+                        progress: Optional[Callable[[int, int], None]] = None,
+                        metrics: Optional['Metrics'] = None) -> IncidentBatch:
+    """Charger les incidents par blocs dans des tableaux préalloués (projection minimale)"""
+    query = query or {}
+    projection = dict(INCIDENT_PROJECTION)
+    if not with_ids:
+        projection['_id'] = 0
+    
+    # Préallouer à partir du nombre de documents attendu
+    expected = collection.count_documents(query) if query else collection.estimated_document_count()
+    batch = IncidentBatch.empty(expected)
+    if metrics is not None:
+        metrics.count_mongo_queries(2)  # Comptage + curseur
+    
+    loaded = 0
+    started = time.perf_counter()
+    last_report = started
+    chunk = []
+    cursor = collection.find(query, projection, batch_size=chunk_size)
+    
+    def flush():
+        nonlocal batch, loaded
+        if loaded + len(chunk) > len(batch):
+            # Documents insérés pendant le chargement
+            batch = batch.resize(max(loaded + len(chunk), 2 * len(batch)))
+        batch.fill_from_documents(chunk, loaded)
+        loaded += len(chunk)
+        chunk.clear()
+    
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            flush()
+            
+            now = time.perf_counter()
+            if progress:
+                progress(loaded, expected)
+            if now - last_report >= 5:
+                logger.info(f"Chargement des incidents: {loaded}/{expected} "
+                            f"({loaded / (now - started):.0f} incidents/s)")
+                last_report = now
+    
+    if chunk:
+        flush()
+    if progress:
+        progress(loaded, expected)
+    
+    elapsed = time.perf_counter() - started
+    logger.info(f"Chargé {loaded} incidents en {elapsed:.2f}s ({loaded / max(elapsed, 1e-9):.0f} incidents/s)")
+    return batch.resize(loaded)
+
+class IncidentSnapshotStore:
+    """Instantané colonnaire de l'historique des incidents sur disque
+    
+    Un fichier binaire par colonne (coordonnées et météo en float32, gravité et catégorie
+    en int8, dates en int64 ms), relu par np.memmap et complété par les incidents créés
+    depuis la dernière synchronisation. Une génération complète est reconstruite depuis
+    MongoDB quand elle dépasse max_age (suppressions et modifications). meta.json donne le
+    nombre de lignes valides : une lecture pendant un ajout ne voit que les lignes publiées.
+    """
+    
+    FORMAT_VERSION = 1
+    COLUMNS = {
+        'latitudes': np.float32,
+        'longitudes': np.float32,
+        'severities': np.int8,
+        'categories': np.int8,
+        'timestamps': np.int64,
+        'temperatures': np.float32,
+        'humidities': np.float32,
+        'wind_speeds': np.float32
+    }
+    
+    def __init__(self, directory: str, max_age: timedelta = timedelta(hours=24),
+                 min_sync_interval: float = 30.0, metrics: Optional['Metrics'] = None):
+        self.directory = directory
+        self.metrics = metrics
+        self.max_age = max_age
+        self.min_sync_interval = min_sync_interval  # Synchronisations rapprochées (workers) sans requête
+    
+    def generation(self) -> Optional[str]:
+        """Génération publiée (change à chaque reconstruction complète depuis MongoDB)"""
+        path = self._generation_path()
+        return os.path.basename(path) if path else None
+    
+    def _generation_path(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, 'current')) as f:
+                generation = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return os.path.join(self.directory, generation) if generation else None
+    
+    def _read_meta(self, path: Optional[str]) -> Optional[Dict]:
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('format_version') == self.FORMAT_VERSION else None
+    
+    def _write_meta(self, path: str, meta: Dict):
+        with open(os.path.join(path, 'meta.json.tmp'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+    
+    def _columns(self, incidents: IncidentBatch, id_width: int) -> Dict[str, np.ndarray]:
+        columns = {name: np.asarray(getattr(incidents, name), dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        columns['timestamps'] = incidents.timestamps.astype('datetime64[ms]').astype(np.int64)
+        columns['ids'] = np.asarray([str(i) for i in incidents.ids], dtype=f'S{id_width}')
+        return columns
+    
+    def _write_columns(self, path: str, columns: Dict[str, np.ndarray], rows: int):
+        """Écrire les colonnes à partir de la ligne rows (troncature d'un ajout interrompu)"""
+        for name, values in columns.items():
+            column_path = os.path.join(path, f"{name}.bin")
+            with open(column_path, 'r+b' if os.path.exists(column_path) else 'wb') as f:
+                f.seek(rows * values.dtype.itemsize)
+                f.write(values.tobytes())
+                f.truncate()
+    
+    def sync(self, collection, chunk_size: int = 5000, full: bool = False) -> int:
+        """Ajouter les incidents créés depuis la dernière synchronisation (lignes ajoutées)"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = acquire_file_lock(os.path.join(self.directory, 'snapshot.lock'))
+        try:
+            path = self._generation_path()
+            meta = self._read_meta(path)
+            now = datetime.now()
+            if (full or meta is None
+                    or now - datetime.fromisoformat(meta['created_at']) > self.max_age):
+                return self._rebuild(collection, chunk_size, now)
+            if time.time() - meta['synced_at'] < self.min_sync_interval:
+                return 0
+            
+            query = {}
+            if meta['watermark'] is not None:
+                query = {'createdAt': {'$gt': np.datetime64(meta['watermark'], 'ms').item()}}
+            incidents = load_incident_batch(collection, query, chunk_size=chunk_size, metrics=self.metrics)
+            
+            if len(incidents) > 0:
+                ids = [str(i) for i in incidents.ids]
+                if max(map(len, ids)) > meta['id_width']:
+                    # Identifiants plus longs que la largeur de la génération : reconstruction
+                    return self._rebuild(collection, chunk_size, now)
+                incidents = incidents.take(np.argsort(incidents.timestamps, kind='stable'))
+                timestamps = incidents.timestamps.astype('datetime64[ms]').astype(np.int64)
+                self._write_columns(path, self._columns(incidents, meta['id_width']), meta['rows'])
+                meta['rows'] += len(incidents)
+                # Dates triées tant que les ajouts suivent le filigrane
+                meta['sorted'] = bool(meta.get('sorted')) and (meta['watermark'] is None or
+                                                                int(timestamps[0]) >= meta['watermark'])
+                latest = int(timestamps[-1])
+                meta['watermark'] = latest if meta['watermark'] is None else max(meta['watermark'], latest)
+            meta['synced_at'] = time.time()
+            self._write_meta(path, meta)
+            return len(incidents)
+        finally:
+            lock_file.close()
+    
+    def _rebuild(self, collection, chunk_size: int, now: datetime) -> int:
+        """Écrire une nouvelle génération complète puis la publier"""
+        incidents = load_incident_batch(collection, None, chunk_size=chunk_size, metrics=self.metrics)
+        incidents = incidents.take(np.argsort(incidents.timestamps, kind='stable'))  # Filtre par date en O(log n)
+        id_width = max([24] + [len(str(i)) for i in incidents.ids])
+        
+        generation = f"{now.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self.directory, generation)
+        os.makedirs(path)
+        self._write_columns(path, self._columns(incidents, id_width), 0)
+        timestamps = incidents.timestamps.astype('datetime64[ms]').astype(np.int64)
+        self._write_meta(path, {
+            'format_version': self.FORMAT_VERSION,
+            'rows': len(incidents),
+            'id_width': id_width,
+            'watermark': int(timestamps.max()) if len(incidents) else None,
+            'sorted': True,
+            'created_at': now.isoformat(),
+            'synced_at': time.time()
+        })
+        
+        # Publication atomique, puis suppression des anciennes générations
+        # (les lecteurs en cours gardent leurs pages projetées)
+        pointer = os.path.join(self.directory, 'current')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(generation)
+        os.replace(pointer + '.tmp', pointer)
+        for name in os.listdir(self.directory):
+            if name != generation and os.path.isdir(os.path.join(self.directory, name)):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        
+        logger.info(f"Instantané des incidents reconstruit: {len(incidents)} incidents")
+        return len(incidents)
+    
+    def load(self, since: Optional[datetime] = None, with_ids: bool = True) -> Optional[IncidentBatch]:
+        """Lire l'instantané (projection mémoire) ; None s'il n'existe pas"""
+        path = self._generation_path()
+        meta = self._read_meta(path)
+        if meta is None:
+            return None
+        rows = meta['rows']
+        
+        def column(name: str, dtype) -> np.ndarray:
+            if rows == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode='r', shape=(rows,))
+        
+        # Sélection par date sur la colonne projetée, avant tout élargissement
+        # (rafraîchissement incrémental en O(nouvelles lignes))
+        timestamps = column('timestamps', np.int64)
+        selected = slice(0, rows)
+        if since is not None:
+            cutoff = np.datetime64(since, 'ms').astype(np.int64)
+            if meta.get('sorted'):
+                selected = slice(int(np.searchsorted(timestamps, cutoff, side='right')), rows)
+            else:
+                selected = np.flatnonzero(timestamps > cutoff)
+        
+        def widened(name: str) -> np.ndarray:
+            return column(name, np.float32)[selected].astype(np.float64)
+        
+        # Gravité, catégorie et dates sans copie ; coordonnées et météo élargies en float64
+        timestamps = timestamps[selected]
+        batch = IncidentBatch(
+            ids=np.empty(len(timestamps), dtype=object),
+            latitudes=widened('latitudes'),
+            longitudes=widened('longitudes'),
+            categories=column('categories', np.int8)[selected],
+            severities=column('severities', np.int8)[selected],
+            timestamps=timestamps.view('datetime64[ms]'),
+            temperatures=widened('temperatures'),
+            humidities=widened('humidities'),
+            wind_speeds=widened('wind_speeds'),
+            population_densities=np.full(len(timestamps), np.nan)
+        )
+        if with_ids:
+            batch.ids[:] = column('ids', f"S{meta['id_width']}")[selected].astype(str)
+        return batch
+
+def load_incident_history(collection, since: Optional[datetime] = None, chunk_size: int = 5000,
+                          with_ids: bool = True, snapshot: Optional[IncidentSnapshotStore] = None,
+                          metrics: Optional['Metrics'] = None) -> IncidentBatch:
+    """Charger l'historique depuis l'instantané local (synchronisé au préalable), sinon depuis MongoDB"""
+    if snapshot is not None:
+        try:
+            snapshot.sync(collection, chunk_size)
+            incidents = snapshot.load(since, with_ids)
+            if incidents is not None:
+                return incidents
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Instantané des incidents indisponible, lecture MongoDB: {e}")
+    query = {'createdAt': {'$gt': since}} if since is not None else None
+    return load_incident_batch(collection, query, chunk_size=chunk_size, with_ids=with_ids, metrics=metrics)
+
+def build_feature_matrix(incidents: IncidentBatch,
+                         densities_fn: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> np.ndarray:
+    """Construire la matrice des caractéristiques d'un lot d'incidents"""
+    features = np.empty((len(incidents), 11), dtype=np.float64)
+    
+    # Caractéristiques géographiques
+    features[:, 0] = incidents.latitudes
+    features[:, 1] = incidents.longitudes
+    
+    # Caractéristiques de l'incident
+    features[:, 2] = incidents.severities
+    features[:, 3] = incidents.categories
+    
+    # Densité de population (calculée en une passe pour les valeurs manquantes)
+    densities = incidents.population_densities
+    missing = np.isnan(densities) | (densities == 0)
+    features[:, 4] = densities
+    if missing.any():
+        features[missing, 4] = densities_fn(incidents.latitudes[missing], incidents.longitudes[missing])
+    
+    # Caractéristiques temporelles (heure, jour de la semaine, mois)
+    days = incidents.timestamps.astype('datetime64[D]')
+    features[:, 5] = (incidents.timestamps - days).astype('timedelta64[h]').astype(np.int64)
+    features[:, 6] = (days.astype(np.int64) + 3) % 7  # Le 01/01/1970 était un jeudi
+    features[:, 7] = incidents.timestamps.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    
+    # Conditions météorologiques (valeurs par défaut si absentes)
+    features[:, 8] = np.where(np.isnan(incidents.temperatures), 25.0, incidents.temperatures)
+    features[:, 9] = np.where(np.isnan(incidents.humidities), 60.0, incidents.humidities)
+    features[:, 10] = np.where(np.isnan(incidents.wind_speeds), 10.0, incidents.wind_speeds)
+    
+    return features
+
+def update_reservoir(reservoir: np.ndarray, seen: int, rows: np.ndarray, capacity: int,
+                     rng: np.random.Generator) -> np.ndarray:
+    """Mettre à jour un échantillon réservoir (algorithme R) avec de nouvelles lignes"""
+    # Remplir d'abord les places libres
+    free = max(capacity - len(reservoir), 0)
+    reservoir = np.concatenate([reservoir, rows[:free]]) if free else reservoir.copy()
+    rows = rows[free:]
+    
+    if len(rows) > 0:
+        # La ligne de rang t remplace une place aléatoire avec une probabilité capacity / (t + 1)
+        ranks = seen + free + np.arange(len(rows))
+        slots = (rng.random(len(rows)) * (ranks + 1)).astype(np.int64)
+        kept = np.flatnonzero(slots < capacity)
+        
+        # En cas de doublon, la dernière ligne tirée l'emporte
+        last = len(kept) - 1 - np.unique(slots[kept][::-1], return_index=True)[1]
+        reservoir[slots[kept][last]] = rows[kept][last]
+    
+    return reservoir
+
+def haversine_distances(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distances (en mètres) entre un point et un ensemble de coordonnées"""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class SpatialIndex:
+    """Index spatial en mémoire des incidents, organisé en grille de cellules"""
+    
+    def __init__(self, cell_size_deg: float = 0.05):
+        self.cell_size_deg = cell_size_deg
+        self.lock = threading.RLock()
+        self.ready = False
+        self.watermark: Optional[datetime] = None
+        self._reset(0)
+    
+    def _reset(self, capacity: int):
+        """Réinitialiser le stockage colonnaire et les cellules"""
+        self.size = 0
+        self.ids = np.empty(capacity, dtype=object)
+        self.latitudes = np.empty(capacity, dtype=np.float64)
+        self.longitudes = np.empty(capacity, dtype=np.float64)
+        self.severities = np.empty(capacity, dtype=np.int8)
+        self.categories = np.empty(capacity, dtype=np.int8)
+        self.timestamps = np.empty(capacity, dtype='datetime64[ms]')
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+    
+    def _grow(self, required: int):
+        """Agrandir les colonnes (doublement de capacité)"""
+        capacity = len(self.latitudes)
+        if required <= capacity:
+            return
+        capacity = max(required, capacity * 2, 1024)
+        for name in ('ids', 'latitudes', 'longitudes', 'severities', 'categories', 'timestamps'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+    
+    def _cell_keys(self, lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Calculer les indices de cellule (ligne, colonne) des coordonnées"""
+        rows = np.floor(np.asarray(lats) / self.cell_size_deg).astype(np.int64)
+        cols = np.floor(np.asarray(lngs) / self.cell_size_deg).astype(np.int64)
+        return rows, cols
+    
+    def rebuild(self, incidents: IncidentBatch):
+        """Reconstruire entièrement l'index à partir des incidents historiques"""
+        with self.lock:
+            self._reset(len(incidents))
+            self.watermark = None
+            self.add(incidents)
+            self.ready = True
+    
+    def add(self, incidents: IncidentBatch):
+        """Ajouter de nouveaux incidents à l'index"""
+        if len(incidents) == 0:
+            return
+        
+        with self.lock:
+            start = self.size
+            end = start + len(incidents)
+            self._grow(end)
+            
+            self.ids[start:end] = incidents.ids
+            self.latitudes[start:end] = incidents.latitudes
+            self.longitudes[start:end] = incidents.longitudes
+            self.severities[start:end] = incidents.severities
+            self.categories[start:end] = incidents.categories
+            self.timestamps[start:end] = incidents.timestamps
+            self.size = end
+            
+            # Regrouper les nouveaux incidents par cellule
+            rows, cols = self._cell_keys(self.latitudes[start:end], self.longitudes[start:end])
+            order = np.lexsort((cols, rows))
+            boundaries = np.flatnonzero(np.diff(rows[order]) | np.diff(cols[order])) + 1
+            for group in np.split(order, boundaries):
+                key = (int(rows[group[0]]), int(cols[group[0]]))
+                positions = group + start
+                existing = self.cells.get(key)
+                self.cells[key] = positions if existing is None else np.concatenate([existing, positions])
+            
+            latest = incidents.timestamps.max().item()
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+    
+    def query_radius(self, lat: float, lng: float, radius: float) -> np.ndarray:
+        """Retourner les positions des incidents situés dans un rayon (mètres)"""
+        with self.lock:
+            if self.size == 0:
+                return np.empty(0, dtype=np.int64)
+            
+            # Boîte englobante du cercle, en degrés
+            dlat = np.degrees(radius / EARTH_RADIUS_M)
+            dlng = dlat / max(np.cos(np.radians(lat)), 1e-6)
+            row_min, col_min = self._cell_keys(lat - dlat, lng - dlng)
+            row_max, col_max = self._cell_keys(lat + dlat, lng + dlng)
+            
+            buckets = [
+                self.cells[(row, col)]
+                for row in range(int(row_min), int(row_max) + 1)
+                for col in range(int(col_min), int(col_max) + 1)
+                if (row, col) in self.cells
+            ]
+            if not buckets:
+                return np.empty(0, dtype=np.int64)
+            
+            candidates = np.concatenate(buckets)
+            distances = haversine_distances(lat, lng, self.latitudes[candidates], self.longitudes[candidates])
+            return candidates[distances <= radius]
+    
+    def columns_within(self, lat_min: float, lat_max: float, lng_min: float, lng_max: float,
+                       margin: float = 0.0) -> Dict[str, np.ndarray]:
+        """Extraire les colonnes des incidents d'une zone (avec une marge en mètres)"""
+        dlat = np.degrees(margin / EARTH_RADIUS_M)
+        dlng = dlat / max(np.cos(np.radians(max(abs(lat_min), abs(lat_max)) + dlat)), 1e-6)
+        
+        with self.lock:
+            lats = self.latitudes[:self.size]
+            lngs = self.longitudes[:self.size]
+            mask = ((lats >= lat_min - dlat) & (lats <= lat_max + dlat) &
+                    (lngs >= lng_min - dlng) & (lngs <= lng_max + dlng))
+            return {
+                'latitudes': lats[mask],
+                'longitudes': lngs[mask],
+                'severities': self.severities[:self.size][mask],
+                'categories': self.categories[:self.size][mask],
+                'timestamps': self.timestamps[:self.size][mask]
+            }
+    
+    def records(self, positions: np.ndarray) -> List[Dict]:
+        """Convertir des positions de l'index en dictionnaires d'incidents"""
+        with self.lock:
+            return [
+                {
+                    'id': incident_id,
+                    'latitude': float(lat),
+                    'longitude': float(lng),
+                    'category': CATEGORY_NAMES[category],
+                    'severity': int(severity),
+                    'timestamp': timestamp
+                }
+                for incident_id, lat, lng, category, severity, timestamp in zip(
+                    self.ids[positions],
+                    self.latitudes[positions],
+                    self.longitudes[positions],
+                    self.categories[positions],
+                    self.severities[positions],
+                    self.timestamps[positions].tolist()
+                )
+            ]
+
+def geohash_encode(lats: np.ndarray, lngs: np.ndarray, precision: int = 6) -> np.ndarray:
+    """Codes geohash entiers (5 bits par caractère, longitude en premier) des coordonnées"""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    lat_idx = np.clip(((np.asarray(lats) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lng_idx = np.clip(((np.asarray(lngs) + 180.0) / 360.0 * (1 << lng_bits)).astype(np.int64), 0, (1 << lng_bits) - 1)
+    return geohash_interleave(lat_idx, lng_idx, precision)
+
+def geohash_interleave(lat_idx: np.ndarray, lng_idx: np.ndarray, precision: int) -> np.ndarray:
+    """Entrelacer les indices de cellule (latitude, longitude) en code geohash"""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    codes = np.zeros(np.broadcast(lat_idx, lng_idx).shape, dtype=np.int64)
+    for i in range(lng_bits):
+        codes |= ((lng_idx >> (lng_bits - 1 - i)) & 1) << (total_bits - 1 - 2 * i)
+    for i in range(lat_bits):
+        codes |= ((lat_idx >> (lat_bits - 1 - i)) & 1) << (total_bits - 2 - 2 * i)
+    return codes
+
+class RiskAggregateStore:
+    """Agrégats de risque par cellule geohash, maintenus au fil de l'eau
+    
+    Chaque cellule conserve le nombre d'incidents, la somme des gravités et
+    l'histogramme des catégories, ainsi que des compteurs journaliers sur une
+    fenêtre glissante (anneau de window_days colonnes, remises à zéro quand
+    leur jour sort de la fenêtre).
+    """
+    
+    def __init__(self, precision: int = 6, window_days: int = 30):
+        self.precision = precision
+        self.lat_bits = 5 * precision // 2
+        self.lng_bits = 5 * precision - self.lat_bits
+        self.cell_lat = 180.0 / (1 << self.lat_bits)
+        self.cell_lng = 360.0 / (1 << self.lng_bits)
+        self.window_days = window_days
+        self.lock = threading.RLock()
+        self.ready = False
+        self._reset()
+    
+    def _reset(self):
+        self.slots: Dict[int, int] = {}
+        self.codes = np.empty(0, dtype=np.int64)
+        # Colonnes : nombre, somme des gravités, puis une colonne par catégorie
+        self.totals = np.zeros((0, 2 + len(CATEGORY_NAMES)))
+        self.buckets = np.zeros((0, self.window_days))
+        self.bucket_days = np.zeros(self.window_days, dtype=np.int64)
+        self.today: Optional[int] = None
+        self._sorted_codes = None
+    
+    def _advance(self, day: int):
+        """Avancer la fenêtre jusqu'au jour donné (expiration des jours sortis)"""
+        if self.today is None:
+            self.today = day
+            self.bucket_days[:] = [day - ((day - column) % self.window_days) for column in range(self.window_days)]
+            return
+        if day <= self.today:
+            return
+        for current in range(max(self.today + 1, day - self.window_days + 1), day + 1):
+            column = current % self.window_days
+            self.buckets[:, column] = 0
+            self.bucket_days[column] = current
+        self.today = day
+    
+    def _slots_for(self, codes: np.ndarray) -> np.ndarray:
+        """Positions des cellules (créées si besoin)"""
+        unique, inverse = np.unique(codes, return_inverse=True)
+        new_codes = [int(code) for code in unique if int(code) not in self.slots]
+        if new_codes:
+            first = len(self.codes)
+            for offset, code in enumerate(new_codes):
+                self.slots[code] = first + offset
+            self.codes = np.concatenate([self.codes, np.array(new_codes, dtype=np.int64)])
+            self.totals = np.vstack([self.totals, np.zeros((len(new_codes), self.totals.shape[1]))])
+            self.buckets = np.vstack([self.buckets, np.zeros((len(new_codes), self.window_days))])
+            self._sorted_codes = None
+        return np.array([self.slots[int(code)] for code in unique], dtype=np.int64)[inverse.ravel()]
+    
+    def rebuild(self, incidents: IncidentBatch, now: Optional[datetime] = None):
+        """Recalculer les agrégats à partir de l'historique complet"""
+        with self.lock:
+            self._reset()
+            self.add(incidents, now)
+            self.ready = True
+    
+    def add(self, incidents: IncidentBatch, now: Optional[datetime] = None):
+        """Intégrer de nouveaux incidents (coût constant par incident)"""
+        with self.lock:
+            today = int(np.datetime64(now or datetime.now(), 'D').astype(np.int64))
+            if len(incidents) == 0:
+                self._advance(today)
+                return
+            
+            slots = self._slots_for(geohash_encode(incidents.latitudes, incidents.longitudes, self.precision))
+            np.add.at(self.totals[:, 0], slots, 1)
+            np.add.at(self.totals[:, 1], slots, incidents.severities.astype(np.float64))
+            np.add.at(self.totals, (slots, 2 + incidents.categories.astype(np.int64)), 1)
+            
+            days = incidents.timestamps.astype('datetime64[D]').astype(np.int64)
+            self._advance(max(today, int(days.max())))
+            recent = days > self.today - self.window_days
+            np.add.at(self.buckets, (slots[recent], days[recent] % self.window_days), 1)
+    
+    def cells_within(self, lat: float, lng: float, radius: float) -> np.ndarray:
+        """Codes des cellules dont le centre est situé dans un rayon (mètres)"""
+        dlat = np.degrees(radius / EARTH_RADIUS_M)
+        dlng = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        lat_idx = np.arange(int((lat - dlat + 90.0) // self.cell_lat), int((lat + dlat + 90.0) // self.cell_lat) + 1)
+        lng_idx = np.arange(int((lng - dlng + 180.0) // self.cell_lng), int((lng + dlng + 180.0) // self.cell_lng) + 1)
+        lat_idx, lng_idx = np.meshgrid(lat_idx, lng_idx, indexing='ij')
+        centre_lats = (lat_idx + 0.5) * self.cell_lat - 90.0
+        centre_lngs = (lng_idx + 0.5) * self.cell_lng - 180.0
+        inside = haversine_distances(lat, lng, centre_lats, centre_lngs) <= radius
+        return geohash_interleave(lat_idx[inside], lng_idx[inside], self.precision)
+    
+    def query(self, lat: float, lng: float, radius: float, now: Optional[datetime] = None) -> Dict:
+        """Indicateurs agrégés des cellules situées dans un rayon"""
+        codes = self.cells_within(lat, lng, radius)
+        with self.lock:
+            self._advance(int(np.datetime64(now or datetime.now(), 'D').astype(np.int64)))
+            if self._sorted_codes is None:
+                order = np.argsort(self.codes)
+                self._sorted_codes = (self.codes[order], order)
+            sorted_codes, order = self._sorted_codes
+            
+            positions = np.minimum(np.searchsorted(sorted_codes, codes), max(len(sorted_codes) - 1, 0))
+            found = sorted_codes[positions] == codes if len(sorted_codes) else np.zeros(len(codes), dtype=bool)
+            slots = order[positions[found]]
+            totals = self.totals[slots].sum(axis=0)
+            recent = self.buckets[slots].sum()
+        
+        return {
+            'count': int(totals[0]),
+            'severity_sum': float(totals[1]),
+            'recent_count': int(recent),
+            'category_counts': totals[2:]
+        }
+
+class RiskGridEngine:
+    """Calcul vectorisé des indicateurs de risque sur une grille de points"""
+    
+    def __init__(self, risk_radius: float = 5000, factor_radius: float = 10000, recent_days: int = 30):
+        self.risk_radius = risk_radius
+        self.factor_radius = factor_radius
+        self.recent_days = recent_days
+    
+    def neighbourhood_sums(self, lat_points: np.ndarray, lng_points: np.ndarray,
+                           lats: np.ndarray, lngs: np.ndarray, weights: np.ndarray,
+                           radius: float) -> np.ndarray:
+        """Sommer les poids des incidents situés dans un rayon de chaque point de la grille"""
+        n_lat, n_lng = len(lat_points), len(lng_points)
+        n_weights = weights.shape[1]
+        diff = np.zeros((n_weights, n_lat * (n_lng + 1)))
+        
+        if len(lats) > 0:
+            # Lignes de la grille couvertes par le cercle de chaque incident
+            dlat = np.degrees(radius / EARTH_RADIUS_M)
+            row_start = np.searchsorted(lat_points, lats - dlat, 'left')
+            row_end = np.searchsorted(lat_points, lats + dlat, 'right')
+            cos_lats = np.cos(np.radians(lats))
+            hav_radius = np.sin(radius / (2 * EARTH_RADIUS_M)) ** 2
+            
+            for offset in range(int((row_end - row_start).max(initial=0))):
+                active = np.flatnonzero(row_start + offset < row_end)
+                rows = row_start[active] + offset
+                grid_lat = lat_points[rows]
+                
+                # Demi-largeur en longitude de l'intersection cercle / ligne de grille
+                hav_lat = np.sin(np.radians(grid_lat - lats[active]) / 2) ** 2
+                hav_lng = (hav_radius - hav_lat) / np.maximum(np.cos(np.radians(grid_lat)) * cos_lats[active], 1e-12)
+                dlng = np.degrees(2 * np.arcsin(np.sqrt(np.clip(hav_lng, 0.0, 1.0))))
+                
+                col_start = np.searchsorted(lng_points, lngs[active] - dlng, 'left')
+                col_end = np.searchsorted(lng_points, lngs[active] + dlng, 'right')
+                valid = (hav_lng >= 0) & (col_end > col_start)
+                
+                # Tableau de différences : +poids au début de l'intervalle, -poids à la fin
+                starts = rows[valid] * (n_lng + 1) + col_start[valid]
+                ends = rows[valid] * (n_lng + 1) + col_end[valid]
+                for k in range(n_weights):
+                    w = weights[active[valid], k]
+                    diff[k] += np.bincount(starts, weights=w, minlength=diff.shape[1])
+                    diff[k] -= np.bincount(ends, weights=w, minlength=diff.shape[1])
+        
+        sums = np.cumsum(diff.reshape(n_weights, n_lat, n_lng + 1), axis=2)[:, :, :n_lng]
+        return np.moveaxis(sums, 0, -1)
+    
+    def evaluate(self, lat_points: np.ndarray, lng_points: np.ndarray, incidents: Dict[str, np.ndarray],
+                 densities: np.ndarray, now: Optional[datetime] = None,
+                 with_categories: bool = True) -> Dict[str, np.ndarray]:
+        """Calculer le niveau de risque et la catégorie dominante de chaque point de la grille"""
+        now = np.datetime64(now or datetime.now(), 'ms')
+        recent_cutoff = now - np.timedelta64(self.recent_days, 'D')
+        
+        lats, lngs = incidents['latitudes'], incidents['longitudes']
+        weights = np.column_stack([
+            np.ones(len(lats)),
+            incidents['severities'].astype(np.float64),
+            (incidents['timestamps'] > recent_cutoff).astype(np.float64)
+        ])
+        stats = self.neighbourhood_sums(lat_points, lng_points, lats, lngs, weights, self.risk_radius)
+        counts = np.rint(stats[..., 0])
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_severity = np.where(counts > 0, stats[..., 1] / counts, 0.0)
+        
+        # Calcul du score de risque (0-1), identique à calculate_risk_level
+        risk_levels = (
+            np.minimum(counts / 10, 1.0) * 0.3 +
+            (avg_severity / 5.0) * 0.3 +
+            np.minimum(np.rint(stats[..., 2]) / 5, 1.0) * 0.2 +
+            np.minimum(densities / 1000, 1.0) * 0.2
+        )
+        risk_levels = np.where(counts > 0, np.minimum(risk_levels, 1.0), 0.1)
+        if not with_categories:
+            return {'risk_levels': risk_levels}
+        
+        # Histogramme des catégories dans le rayon d'analyse des facteurs
+        one_hot = np.zeros((len(lats), len(CATEGORY_NAMES)))
+        one_hot[np.arange(len(lats)), incidents['categories']] = 1.0
+        histogram = self.neighbourhood_sums(lat_points, lng_points, lats, lngs, one_hot, self.factor_radius)
+        dominant = np.where(histogram.max(axis=2) >= 0.5, histogram.argmax(axis=2), -1)
+        
+        return {'risk_levels': risk_levels, 'dominant_categories': dominant}
+
+class ClusteringEngine:
+    """Clustering DBSCAN des incidents en distance haversine, avec résumés vectorisés"""
+    
+    def __init__(self, eps_meters: float = 1000, min_samples: int = 2):
+        self.eps_meters = eps_meters
+        self.min_samples = min_samples
+    
+    def fit(self, lats: np.ndarray, lngs: np.ndarray, eps_meters: Optional[float] = None,
+            min_samples: Optional[int] = None) -> np.ndarray:
+        """Étiqueter les incidents (-1 pour le bruit)"""
+        from sklearn.cluster import DBSCAN
+        
+        eps_meters = eps_meters or self.eps_meters
+        min_samples = min_samples or self.min_samples
+        
+        # Les coordonnées identiques ne sont indexées qu'une fois, pondérées par leur nombre
+        coordinates, inverse, weights = np.unique(
+            np.column_stack([lats, lngs]), axis=0, return_inverse=True, return_counts=True
+        )
+        dbscan = DBSCAN(eps=eps_meters / EARTH_RADIUS_M, min_samples=min_samples,
+                        metric='haversine', algorithm='ball_tree')
+        labels = dbscan.fit_predict(np.radians(coordinates), sample_weight=weights)
+        return labels[inverse.ravel()]
+    
+    def summarize(self, labels: np.ndarray, lats: np.ndarray, lngs: np.ndarray,
+                  severities: np.ndarray) -> Dict[str, np.ndarray]:
+        """Centres, rayons (m), effectifs et gravité moyenne de tous les clusters en une passe"""
+        clustered = np.flatnonzero(labels >= 0)
+        n_clusters = int(labels.max(initial=-1)) + 1
+        members = labels[clustered]
+        
+        counts = np.bincount(members, minlength=n_clusters)
+        safe_counts = np.maximum(counts, 1)
+        center_lats = np.bincount(members, weights=lats[clustered], minlength=n_clusters) / safe_counts
+        center_lngs = np.bincount(members, weights=lngs[clustered], minlength=n_clusters) / safe_counts
+        avg_severities = np.bincount(members, weights=severities[clustered], minlength=n_clusters) / safe_counts
+        
+        # Distance de chaque incident au centre de son cluster
+        distances = haversine_distances(center_lats[members], center_lngs[members],
+                                        lats[clustered], lngs[clustered])
+        radii = np.zeros(n_clusters)
+        np.maximum.at(radii, members, distances)
+        
+        # Positions des incidents regroupées par cluster
+        order = clustered[np.argsort(members, kind='stable')]
+        positions = np.split(order, np.cumsum(counts)[:-1]) if n_clusters else []
+        
+        return {
+            'counts': counts,
+            'center_latitudes': center_lats,
+            'center_longitudes': center_lngs,
+            'radii': radii,
+            'average_severities': avg_severities,
+            'positions': positions
+        }
+
+def tile_x(lngs, zoom: int) -> np.ndarray:
+    """Colonne XYZ (Web Mercator) des longitudes"""
+    n = 2 ** zoom
+    return np.clip(np.floor((np.asarray(lngs) + 180.0) / 360.0 * n), 0, n - 1).astype(np.int64)
+
+def tile_y(lats, zoom: int) -> np.ndarray:
+    """Ligne XYZ (Web Mercator, ligne 0 au nord) des latitudes"""
+    n = 2 ** zoom
+    lats = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -85.0511, 85.0511))
+    return np.clip(np.floor((1.0 - np.arcsinh(np.tan(lats)) / np.pi) / 2.0 * n), 0, n - 1).astype(np.int64)
+
+def tile_cell_centers(zoom: int, x: int, y: int, cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitudes (du nord au sud) et longitudes des centres des cellules d'une tuile"""
+    n = 2 ** zoom
+    offsets = (np.arange(cells) + 0.5) / cells
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (y + offsets) / n))))
+    lngs = (x + offsets) / n * 360.0 - 180.0
+    return lats, lngs
+
+@functools.lru_cache(maxsize=4)
+def load_population_density(path: Optional[str]) -> 'PopulationDensityProvider':
+    """Raster de densité (fichier s'il existe, simulation sinon), chargé une fois par processus"""
+    if path and os.path.exists(path):
+        return PopulationDensityProvider.from_file(path)
+    return PopulationDensityProvider.simulated()
+
+def render_risk_tiles(tiles: List[Tuple[int, int, int]], settings: Dict) -> int:
+    """Calculer et écrire un bloc de tuiles voisines (exécuté dans un processus du pool)"""
+    snapshot = {name: np.load(os.path.join(settings['snapshot_dir'], f"{name}.npy"), mmap_mode='r')
+                for name in ('latitudes', 'longitudes', 'severities', 'categories', 'timestamps')}
+    engine = RiskGridEngine(risk_radius=settings['risk_radius'], recent_days=settings['recent_days'])
+    density = load_population_density(settings['population_grid_path'])
+    cells = settings['cells']
+    now = np.datetime64(settings['now'], 'ms')
+    margin = np.degrees(settings['risk_radius'] / EARTH_RADIUS_M)
+    
+    # Incidents du bloc (instantané trié par latitude) puis de chaque tuile
+    centers = {tile: tile_cell_centers(*tile, cells) for tile in tiles}
+    lat_min = min(lats[-1] for lats, _ in centers.values()) - margin
+    lat_max = max(lats[0] for lats, _ in centers.values()) + margin
+    start, end = np.searchsorted(snapshot['latitudes'], [lat_min, lat_max])
+    block = {name: np.asarray(column[start:end]) for name, column in snapshot.items()}
+    
+    for (zoom, x, y), (lats, lngs) in centers.items():
+        lat_points = lats[::-1]  # Ordre croissant attendu par RiskGridEngine
+        dlng = margin / max(np.cos(np.radians(max(abs(lat_points[0]), abs(lat_points[-1])) + margin)), 1e-6)
+        mask = ((block['latitudes'] >= lat_points[0] - margin) & (block['latitudes'] <= lat_points[-1] + margin) &
+                (block['longitudes'] >= lngs[0] - dlng) & (block['longitudes'] <= lngs[-1] + dlng))
+        incidents = {name: column[mask] for name, column in block.items()}
+        
+        grid_lats, grid_lngs = np.meshgrid(lat_points, lngs, indexing='ij')
+        result = engine.evaluate(lat_points, lngs, incidents, density.densities(grid_lats, grid_lngs),
+                                 now=now, with_categories=False)
+        # Niveau de risque sur un octet, lignes du nord au sud
+        values = np.rint(result['risk_levels'][::-1] * 255).astype(np.uint8)
+        
+        path = os.path.join(settings['tiles_dir'], str(zoom), str(x), f"{y}.bin")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(values.tobytes())
+        os.replace(f"{path}.tmp", path)
+    
+    return len(tiles)
+
+class RiskTilePyramid:
+    """Pyramide de tuiles XYZ de niveaux de risque sur l'Algérie, stockée sur disque
+    
+    Chaque tuile est un tableau cells x cells d'octets (risque x 255, lignes du nord au
+    sud) écrit dans tiles_dir/{z}/{x}/{y}.bin. La génération est répartie sur un pool
+    de processus ; après la génération complète, seules les tuiles proches des nouveaux
+    incidents sont recalculées.
+    """
+    
+    def __init__(self, tiles_dir: str, min_zoom: int = 5, max_zoom: int = 9, cells: int = 64,
+                 bounds: Optional[Dict[str, float]] = None, workers: Optional[int] = None,
+                 block_size: int = 4):
+        self.tiles_dir = tiles_dir
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cells = cells
+        self.bounds = bounds or ALGERIA_BOUNDS
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size  # Tuiles voisines calculées par tâche (block_size x block_size)
+        self.metadata_path = os.path.join(tiles_dir, 'pyramid.json')
+    
+    def tile_range(self, zoom: int) -> Tuple[range, range]:
+        """Colonnes et lignes des tuiles couvrant l'emprise à un niveau de zoom"""
+        x_min, x_max = tile_x([self.bounds['lng_min'], self.bounds['lng_max']], zoom)
+        y_min, y_max = tile_y([self.bounds['lat_max'], self.bounds['lat_min']], zoom)
+        return range(int(x_min), int(x_max) + 1), range(int(y_min), int(y_max) + 1)
+    
+    def covers(self, zoom: int, x: int, y: int) -> bool:
+        if not self.min_zoom <= zoom <= self.max_zoom:
+            return False
+        xs, ys = self.tile_range(zoom)
+        return x in xs and y in ys
+    
+    def all_tiles(self) -> List[Tuple[int, int, int]]:
+        tiles = []
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            xs, ys = self.tile_range(zoom)
+            tiles.extend((zoom, x, y) for x in xs for y in ys)
+        return tiles
+    
+    def tiles_touched(self, lats: np.ndarray, lngs: np.ndarray, radius: float) -> List[Tuple[int, int, int]]:
+        """Tuiles dont au moins une cellule est à moins de radius mètres des coordonnées"""
+        lats, lngs = np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)
+        if len(lats) == 0:
+            return []
+        dlat = np.degrees(radius / EARTH_RADIUS_M)
+        dlng = dlat / np.maximum(np.cos(np.radians(np.abs(lats) + dlat)), 1e-6)
+        
+        touched = set()
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            xs, ys = self.tile_range(zoom)
+            x_min, x_max = tile_x(lngs - dlng, zoom), tile_x(lngs + dlng, zoom)
+            y_min, y_max = tile_y(lats + dlat, zoom), tile_y(lats - dlat, zoom)
+            for dx in range(int((x_max - x_min).max()) + 1):
+                for dy in range(int((y_max - y_min).max()) + 1):
+                    valid = (x_min + dx <= x_max) & (y_min + dy <= y_max)
+                    keys = np.unique(np.column_stack([x_min[valid] + dx, y_min[valid] + dy]), axis=0)
+                    touched.update((zoom, int(x), int(y)) for x, y in keys if x in xs and y in ys)
+        return sorted(touched)
+    
+    def tile_path(self, zoom: int, x: int, y: int) -> str:
+        return os.path.join(self.tiles_dir, str(zoom), str(x), f"{y}.bin")
+    
+    def read(self, zoom: int, x: int, y: int) -> Optional[bytes]:
+        """Contenu d'une tuile générée (None si absente ou hors de la pyramide)"""
+        if not self.covers(zoom, x, y):
+            return None
+        try:
+            with open(self.tile_path(zoom, x, y), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def load_metadata(self) -> Optional[Dict]:
+        try:
+            with open(self.metadata_path) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Pyramide générée avec d'autres paramètres : à régénérer entièrement
+        layout = (metadata.get('min_zoom'), metadata.get('max_zoom'), metadata.get('cells'), metadata.get('bounds'))
+        if layout != (self.min_zoom, self.max_zoom, self.cells, self.bounds):
+            return None
+        return metadata
+    
+    def describe(self) -> Dict:
+        metadata = self.load_metadata() or {}
+        return {
+            'min_zoom': self.min_zoom,
+            'max_zoom': self.max_zoom,
+            'cells': self.cells,
+            'bounds': self.bounds,
+            'encoding': 'uint8, risk_level * 255, row-major (north to south)',
+            'url_template': '/risk-tiles/{z}/{x}/{y}',
+            'generated_at': metadata.get('generated_at'),
+            'updated_at': metadata.get('updated_at'),
+            'tiles': metadata.get('tiles', 0)
+        }
+    
+    def generate(self, incidents: Dict[str, np.ndarray], tiles: Optional[List[Tuple[int, int, int]]] = None,
+                 watermark: Optional[datetime] = None, engine: Optional[RiskGridEngine] = None,
+                 population_grid_path: Optional[str] = None, now: Optional[datetime] = None) -> int:
+        """Calculer des tuiles (toutes par défaut) à partir des colonnes d'incidents"""
+        full = tiles is None
+        tiles = self.all_tiles() if full else tiles
+        if not tiles:
+            return 0
+        engine = engine or RiskGridEngine()
+        now = now or datetime.now()
+        
+        # Instantané trié par latitude, partagé par les processus du pool (lecture mmap)
+        snapshot_dir = os.path.join(self.tiles_dir, 'snapshot')
+        os.makedirs(snapshot_dir, exist_ok=True)
+        order = np.argsort(incidents['latitudes'], kind='stable')
+        for name in ('latitudes', 'longitudes', 'severities', 'categories', 'timestamps'):
+            np.save(os.path.join(snapshot_dir, f"{name}.npy"), np.asarray(incidents[name])[order])
+        
+        settings = {
+            'tiles_dir': self.tiles_dir,
+            'snapshot_dir': snapshot_dir,
+            'cells': self.cells,
+            'risk_radius': engine.risk_radius,
+            'recent_days': engine.recent_days,
+            'now': now.isoformat(),
+            'population_grid_path': population_grid_path
+        }
+        
+        # Blocs de tuiles voisines : un seul filtrage des incidents par bloc
+        blocks: Dict[Tuple[int, int, int], List] = {}
+        for zoom, x, y in tiles:
+            blocks.setdefault((zoom, x // self.block_size, y // self.block_size), []).append((zoom, x, y))
+        
+        try:
+            # Quelques tuiles (mise à jour incrémentale) : sans le coût de démarrage du pool
+            if len(blocks) == 1 or self.workers == 1 or len(tiles) <= self.block_size ** 2:
+                rendered = sum(render_risk_tiles(block, settings) for block in blocks.values())
+            else:
+                # 'spawn' : les processus de calcul n'héritent pas des threads du service
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(blocks)),
+                                         mp_context=multiprocessing.get_context('spawn')) as executor:
+                    rendered = sum(executor.map(render_risk_tiles, blocks.values(),
+                                                [settings] * len(blocks)))
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+        
+        metadata = self.load_metadata() or {}
+        timestamp = datetime.now().isoformat()
+        metadata.update({
+            'min_zoom': self.min_zoom,
+            'max_zoom': self.max_zoom,
+            'cells': self.cells,
+            'bounds': self.bounds,
+            'updated_at': timestamp,
+            'watermark': watermark.isoformat() if watermark else metadata.get('watermark'),
+            'tiles': len(self.all_tiles())
+        })
+        if full:
+            metadata['generated_at'] = timestamp
+        with open(f"{self.metadata_path}.tmp", 'w') as f:
+            json.dump(metadata, f)
+        os.replace(f"{self.metadata_path}.tmp", self.metadata_path)
+        return rendered
+
+_NULL_TIMER = nullcontext()
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'started')
+    
+    def __init__(self, metrics: 'Metrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+    
+    def __exit__(self, *exc):
+        self.metrics.observe('stage_seconds', time.perf_counter() - self.started, stage=self.stage)
+
+class Metrics:
+    """Compteurs et histogrammes en mémoire, exposés au format texte Prometheus"""
+    
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+    SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+    
+    def __init__(self, enabled: bool = True, namespace: str = 'disaster_ai'):
+        self.enabled = enabled
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.definitions: Dict[str, Tuple[str, str, Tuple]] = {}
+        self.values: Dict[str, Dict[Tuple, object]] = {}
+        self.collectors: List[Callable[[], List[Tuple[str, Dict, float]]]] = []
+        
+        self.define('stage_seconds', 'histogram', "Durée de chaque étape de traitement")
+        self.define('request_seconds', 'histogram', "Durée des requêtes HTTP par route")
+        self.define('request_mongo_queries', 'histogram', "Requêtes MongoDB par requête HTTP",
+                    self.COUNT_BUCKETS)
+        self.define('batch_size', 'histogram', "Taille des lots d'incidents reçus", self.SIZE_BUCKETS)
+        self.define('mongo_queries_total', 'counter', "Requêtes MongoDB émises")
+        self.define('training_jobs_total', 'counter', "Tâches d'entraînement terminées")
+        self.define('stream_events_total', 'counter', "Incidents reçus par le consommateur Redis")
+        self.define('stream_latency_seconds', 'histogram', "Latence réception -> publication du consommateur Redis")
+        self.define('nearby_query_failures_total', 'counter', "Requêtes de proximité MongoDB échouées ou abandonnées")
+    
+    def define(self, name: str, kind: str, description: str, buckets: Tuple = LATENCY_BUCKETS):
+        """Déclarer une métrique (counter ou histogram)"""
+        self.definitions[name] = (kind, description, buckets)
+        self.values.setdefault(name, {})
+    
+    def increment(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        buckets = self.definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            state = series.get(key)
+            if state is None:
+                # [compteurs par intervalle (+Inf inclus), somme, nombre]
+                state = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def timer(self, stage: str):
+        """Mesurer la durée d'une étape (contexte sans effet si les métriques sont désactivées)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+    
+    def count_mongo_queries(self, count: int = 1):
+        """Compter les requêtes MongoDB, au total et pour la requête HTTP en cours"""
+        if not self.enabled:
+            return
+        self.increment('mongo_queries_total', count)
+        if has_request_context():
+            g.mongo_queries = g.get('mongo_queries', 0) + count
+    
+    def add_collector(self, collector: Callable[[], List[Tuple[str, Dict, float]]]):
+        """Ajouter des compteurs lus au moment de l'export (nom, labels, valeur)"""
+        self.collectors.append(collector)
+    
+    def render(self) -> str:
+        """Exporter les métriques au format texte Prometheus"""
+        lines = []
+        
+        with self.lock:
+            snapshot = {name: {key: copy.deepcopy(state) for key, state in series.items()}
+                        for name, series in self.values.items()}
+        
+        for name, (kind, description, buckets) in self.definitions.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full_name} {description}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for key, state in snapshot[name].items():
+                if kind == 'counter':
+                    lines.append(f"{full_name}{self._format_labels(key)} {state}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], state[0]):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{self._format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(key)} {state[1]}")
+                lines.append(f"{full_name}_count{self._format_labels(key)} {state[2]}")
+        
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"{full_name}{self._format_labels(tuple(sorted(labels.items())))} {value}")
+        
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def _format_labels(labels: Tuple) -> str:
+        if not labels:
+            return ''
+        pairs = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{key}="{value}"')
+        return '{' + ','.join(pairs) + '}'
+
+def timed(stage: str):
+    """Mesurer la durée d'une méthode du service dans l'histogramme des étapes"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class PredictionCache:
+    """Cache des prédictions de risque : LRU en mémoire avec TTL, devant un niveau Redis partagé"""
+    
+    def __init__(self, redis_client, ttl: int = 3600, max_entries: int = 256, tile_size: float = 0.01,
+                 margin: float = 10000, prefix: str = 'ai:risk'):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tile_size = tile_size
+        self.margin_deg = np.degrees(margin / EARTH_RADIUS_M)
+        self.prefix = prefix
+        # Clé -> (expiration, valeur, emprise [lat_min, lat_max, lng_min, lng_max] pour l'invalidation)
+        self.entries: 'OrderedDict[str, Tuple[float, List[Dict], np.ndarray]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.redis_retry_at = 0.0
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def normalize_bounds(self, lat_min: float, lat_max: float, lng_min: float,
+                         lng_max: float) -> Tuple[float, float, float, float]:
+        """Aligner une emprise sur la grille de tuiles du cache (vers l'extérieur)"""
+        tile = self.tile_size
+        return (
+            round(np.floor(lat_min / tile + 1e-9) * tile, 6),
+            round(np.ceil(lat_max / tile - 1e-9) * tile, 6),
+            round(np.floor(lng_min / tile + 1e-9) * tile, 6),
+            round(np.ceil(lng_max / tile - 1e-9) * tile, 6)
+        )
+    
+    def make_key(self, bounds: Tuple[float, float, float, float], resolution: Tuple[int, int]) -> str:
+        """Construire la clé de cache d'une emprise normalisée et d'une résolution"""
+        return '{:.6f}:{:.6f}:{:.6f}:{:.6f}:{}x{}'.format(*bounds, *resolution)
+    
+    def _redis_available(self) -> bool:
+        return self.redis_client is not None and time.time() >= self.redis_retry_at
+    
+    def _redis_failed(self, e: Exception):
+        # Désactiver temporairement le niveau Redis pour ne pas ralentir les requêtes
+        logger.warning(f"Cache Redis indisponible: {e}")
+        self.redis_retry_at = time.time() + 30
+    
+    def _cells(self, bounds: Tuple[float, float, float, float]) -> List[str]:
+        """Cellules de 1° couvertes par une emprise élargie de la marge d'invalidation"""
+        lat_min, lat_max, lng_min, lng_max = bounds
+        margin_lng = self.margin_deg / max(np.cos(np.radians(max(abs(lat_min), abs(lat_max)))), 1e-6)
+        return [
+            f"{self.prefix}:cell:{row}:{col}"
+            for row in range(int(np.floor(lat_min - self.margin_deg)), int(np.floor(lat_max + self.margin_deg)) + 1)
+            for col in range(int(np.floor(lng_min - margin_lng)), int(np.floor(lng_max + margin_lng)) + 1)
+        ]
+    
+    @staticmethod
+    def _key_bounds(key: str) -> np.ndarray:
+        return np.array(key.split(':')[:4], dtype=np.float64)
+    
+    def _affected(self, bounds: np.ndarray, lats: np.ndarray, lngs: np.ndarray,
+                  chunk_size: int = 4096) -> np.ndarray:
+        """Entrées (emprises n x 4) dont la zone élargie de la marge contient un des incidents"""
+        affected = np.zeros(len(bounds), dtype=bool)
+        if len(bounds) == 0:
+            return affected
+        lat_min, lat_max, lng_min, lng_max = (bounds[:, [i]] for i in range(4))
+        for start in range(0, len(lats), chunk_size):
+            lat = np.asarray(lats[start:start + chunk_size], dtype=np.float64)
+            lng = np.asarray(lngs[start:start + chunk_size], dtype=np.float64)
+            margin_lng = self.margin_deg / np.maximum(np.cos(np.radians(lat)), 1e-6)
+            inside = ((lat_min - self.margin_deg <= lat) & (lat <= lat_max + self.margin_deg) &
+                      (lng_min - margin_lng <= lng) & (lng <= lng_max + margin_lng))
+            affected |= inside.any(axis=1)
+        return affected
+    
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Lire une entrée (mémoire locale puis Redis)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return entry[1]
+                del self.entries[key]
+        
+        if self._redis_available():
+            try:
+                payload = self.redis_client.get(f"{self.prefix}:{key}")
+                if payload is not None:
+                    value = json.loads(payload)
+                    self._store_local(key, value, 'redis_hits')
+                    return value
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+    
+    def set(self, key: str, bounds: Tuple[float, float, float, float], value: List[Dict]):
+        """Écrire une entrée dans les deux niveaux de cache"""
+        self._store_local(key, value)
+        
+        if self._redis_available():
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.setex(f"{self.prefix}:{key}", self.ttl, json.dumps(value))
+                # Référencer la clé dans les cellules qu'elle couvre, pour l'invalidation
+                for cell in self._cells(bounds):
+                    pipe.sadd(cell, key)
+                    pipe.expire(cell, self.ttl)
+                pipe.execute()
+            except redis.RedisError as e:
+                self._redis_failed(e)
+    
+    def _store_local(self, key: str, value: List[Dict], stat: Optional[str] = None):
+        bounds = self._key_bounds(key)
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value, bounds)
+            self.entries.move_to_end(key)
+            if stat is not None:
+                self.stats[stat] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def invalidate_points(self, lats: np.ndarray, lngs: np.ndarray) -> int:
+        """Évincer les entrées dont la zone contient de nouveaux incidents"""
+        if len(lats) == 0:
+            return 0
+        
+        # Test vectorisé hors verrou sur une copie des emprises ; verrou repris pour évincer
+        with self.lock:
+            keys = list(self.entries)
+            bounds = np.array([self.entries[key][2] for key in keys]).reshape(-1, 4)
+        stale = [key for key, affected in zip(keys, self._affected(bounds, lats, lngs)) if affected]
+        evicted = 0
+        with self.lock:
+            for key in stale:
+                if self.entries.pop(key, None) is not None:
+                    evicted += 1
+        
+        if self._redis_available():
+            try:
+                cells = {f"{self.prefix}:cell:{row}:{col}"
+                         for row, col in zip(np.floor(lats).astype(int), np.floor(lngs).astype(int))}
+                for cell in cells:
+                    keys = [k.decode() if isinstance(k, bytes) else k for k in self.redis_client.smembers(cell)]
+                    bounds = np.array([self._key_bounds(k) for k in keys]).reshape(-1, 4)
+                    stale = [k for k, affected in zip(keys, self._affected(bounds, lats, lngs)) if affected]
+                    if stale:
+                        self.redis_client.delete(*[f"{self.prefix}:{k}" for k in stale])
+                        self.redis_client.srem(cell, *stale)
+                        evicted += len(stale)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        
+        with self.lock:
+            self.stats['evictions'] += evicted
+        return evicted
+
+class SingleFlight:
+    """Regroupement des calculs identiques simultanés
+    
+    La première requête d'une clé exécute le calcul ; les requêtes identiques arrivées
+    pendant ce calcul attendent et reçoivent le même résultat (ou la même exception).
+    Rien n'est conservé après la fin du calcul : ce n'est pas un cache. Le résultat est
+    partagé entre les appelants et ne doit pas être modifié.
+    """
+    
+    def __init__(self):
+        self.calls: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.stats = {'executions': 0, 'coalesced': 0}
+    
+    @property
+    def in_flight(self) -> int:
+        """Nombre de calculs en cours"""
+        return len(self.calls)
+    
+    def do(self, key: str, compute: Callable[[], object]):
+        """Exécuter compute, ou attendre le calcul identique déjà en cours"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.stats['executions'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = compute()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+def average_path_length(n_samples) -> np.ndarray:
+    """Longueur moyenne c(n) d'une recherche infructueuse dans un arbre binaire de n échantillons"""
+    n = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n)
+    lengths[n == 2] = 1.0
+    large = n > 2
+    lengths[large] = 2.0 * (np.log(n[large] - 1.0) + np.euler_gamma) - 2.0 * (n[large] - 1.0) / n[large]
+    return lengths
+
+class FlatIsolationForest:
+    """IsolationForest entraîné exporté en tableaux de nœuds NumPy, pour l'inférence
+    
+    Tous les arbres sont parcourus ensemble, un niveau de profondeur à la fois, et le
+    score n'est calculé qu'une fois : l'étiquette en est déduite (predict et
+    decision_function de scikit-learn parcourent chacun toute la forêt). Les feuilles
+    bouclent sur elles-mêmes ; leur valeur est profondeur + c(échantillons de la feuille).
+    """
+    
+    FORMAT_VERSION = 1
+    
+    def __init__(self, features: np.ndarray, thresholds: np.ndarray, children: np.ndarray,
+                 leaf_values: np.ndarray, roots: np.ndarray, max_depth: int, normalizer: float,
+                 offset: float, n_features: int, chunk_rows: int = 1024):
+        self.features = features
+        self.thresholds = thresholds
+        self.children = children  # (n_nœuds, 2) : [gauche, droite]
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.normalizer = normalizer  # n_arbres * c(max_samples)
+        self.offset = offset
+        self.n_features = n_features
+        self.chunk_rows = chunk_rows
+    
+    @classmethod
+    def from_estimator(cls, forest: 'IsolationForest') -> 'FlatIsolationForest':
+        """Exporter un IsolationForest entraîné"""
+        n_features = forest.n_features_in_
+        # scikit-learn n'indexe les colonnes de chaque arbre que s'il en tire un sous-ensemble
+        subsample_features = forest._max_features != n_features
+        
+        features, thresholds, children, leaf_values, roots = [], [], [], [], []
+        max_depth, start = 0, 0
+        for estimator, estimator_features in zip(forest.estimators_, forest.estimators_features_):
+            tree = estimator.tree_
+            left, right = tree.children_left, tree.children_right
+            leaf = left == -1
+            nodes = np.arange(tree.node_count)
+            
+            # Profondeur des nœuds (un parent précède toujours ses enfants)
+            depths = np.zeros(tree.node_count, dtype=np.int64)
+            for node in np.flatnonzero(~leaf):
+                depths[left[node]] = depths[right[node]] = depths[node] + 1
+            
+            tree_features = np.asarray(estimator_features)[tree.feature] if subsample_features else tree.feature
+            features.append(np.where(leaf, 0, tree_features).astype(np.int32))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            children.append(np.column_stack([np.where(leaf, nodes, left), np.where(leaf, nodes, right)]) + start)
+            leaf_values.append(depths + average_path_length(tree.n_node_samples))
+            roots.append(start)
+            max_depth = max(max_depth, int(depths.max()))
+            start += tree.node_count
+        
+        normalizer = len(forest.estimators_) * float(average_path_length([forest.max_samples_])[0])
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(children).astype(np.int32),
+                   np.concatenate(leaf_values), np.asarray(roots, dtype=np.int32), max_depth, normalizer,
+                   float(forest.offset_), n_features)
+    
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        """Opposé du score d'anomalie (identique à IsolationForest.score_samples)"""
+        # Comparaisons en float32, comme les arbres de scikit-learn
+        X = np.ascontiguousarray(X, dtype=np.float32).reshape(-1, self.n_features)
+        children = self.children.ravel()
+        depths = np.empty(len(X))
+        for start in range(0, len(X), self.chunk_rows):
+            chunk = X[start:start + self.chunk_rows]
+            # Indices plats : ligne * n_features + variable du nœud courant de chaque arbre
+            row_offsets = (np.arange(len(chunk), dtype=np.int32) * self.n_features)[:, None]
+            nodes = np.repeat(self.roots[None, :], len(chunk), axis=0)
+            for _ in range(self.max_depth):
+                values = np.take(chunk.ravel(), row_offsets + np.take(self.features, nodes))
+                go_right = values > np.take(self.thresholds, nodes)
+                nodes = np.take(children, 2 * nodes + go_right)
+            depths[start:start + len(chunk)] = np.take(self.leaf_values, nodes).sum(axis=1)
+        
+        if self.normalizer == 0:
+            return -np.ones(len(X))
+        return -(2.0 ** (-depths / self.normalizer))
+    
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return self.score_samples(X) - self.offset
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_scores(X)[0]
+    
+    def predict_with_scores(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Étiquettes (-1 = anomalie, 1 = normal) et decision_function en un seul parcours"""
+        scores = self.decision_function(X)
+        return np.where(scores < 0, -1, 1), scores
+    
+    def save(self, path: str):
+        np.savez(path, format_version=self.FORMAT_VERSION, features=self.features, thresholds=self.thresholds,
+                 children=self.children, leaf_values=self.leaf_values, roots=self.roots,
+                 parameters=np.array([self.max_depth, self.normalizer, self.offset, self.n_features]))
+    
+    @classmethod
+    def load(cls, path: str) -> 'FlatIsolationForest':
+        with np.load(path) as data:
+            if int(data['format_version']) != cls.FORMAT_VERSION:
+                raise ValueError(f"Format de forêt non pris en charge: {path}")
+            max_depth, normalizer, offset, n_features = data['parameters']
+            return cls(data['features'], data['thresholds'], data['children'], data['leaf_values'],
+                       data['roots'], int(max_depth), float(normalizer),
+                       float(offset), int(n_features))
+
+# Segmentation des détecteurs d'anomalies : un modèle global, un par catégorie,
+# ou un par catégorie et grande région (bandes de latitude)
+SEGMENTATIONS = ('global', 'category', 'category_region')
+REGION_NAMES = np.array(['sud', 'hauts_plateaux', 'nord'], dtype=object)
+REGION_LATITUDES = (33.0, 35.0)  # Limites sud des hauts plateaux et du nord
+
+def segment_codes(X: np.ndarray, segmentation: str) -> np.ndarray:
+    """Segment de chaque ligne de la matrice des caractéristiques (catégorie, région)"""
+    categories = X[:, 3].astype(np.int64)
+    if segmentation == 'category_region':
+        regions = np.searchsorted(REGION_LATITUDES, X[:, 0], side='right')
+        return categories * len(REGION_NAMES) + regions
+    return categories
+
+def segment_name(code: int, segmentation: str) -> str:
+    if segmentation == 'category_region':
+        category, region = divmod(int(code), len(REGION_NAMES))
+        return f"{CATEGORY_NAMES[category]}-{REGION_NAMES[region]}"
+    return str(CATEGORY_NAMES[int(code)])
+
+@dataclass(frozen=True)
+class SegmentModel:
+    """Scaler et forêt compilée d'un segment (catégorie, région)"""
+    scaler: 'StandardScaler'
+    anomaly_engine: FlatIsolationForest
+    samples: int
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Ensemble immuable et versionné des modèles utilisés pour le scoring"""
+    version: str
+    scaler: 'StandardScaler'
+    anomaly_detector: 'IsolationForest'
+    reservoir: np.ndarray
+    samples_seen: int
+    watermark: Optional[datetime]
+    trained_at: datetime
+    anomaly_engine: Optional[FlatIsolationForest] = None  # Inférence compilée du détecteur
+    segmentation: str = 'global'
+    # Modèles par segment ; les segments absents sont évalués par le modèle global
+    segments: Dict[int, SegmentModel] = field(default_factory=dict)
+
+def new_model_version() -> str:
+    """Générer un identifiant de version de modèles"""
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+def fit_detector(X: np.ndarray) -> Tuple['StandardScaler', 'IsolationForest']:
+    """Entraîner un scaler et un IsolationForest (exécuté aussi dans les processus du pool)"""
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    
+    anomaly_detector = IsolationForest(
+        contamination=0.1,
+        random_state=42,
+        n_estimators=100
+    )
+    anomaly_detector.fit(X_scaled)
+    return scaler, anomaly_detector
+
+def fit_detectors(matrices: List[np.ndarray], workers: int = 1) -> List[Tuple['StandardScaler', 'IsolationForest']]:
+    """Entraîner un détecteur par matrice, en parallèle sur un pool de processus"""
+    if workers > 1 and len(matrices) > 1:
+        # 'spawn' : les processus d'entraînement n'héritent pas des threads du service
+        with ProcessPoolExecutor(max_workers=min(workers, len(matrices)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            return list(executor.map(fit_detector, matrices))
+    return [fit_detector(matrix) for matrix in matrices]
+
+def segment_matrices(X: np.ndarray, segmentation: str, min_samples: int = 50) -> Tuple[List[int], List[np.ndarray]]:
+    """Codes et lignes des segments suffisamment représentés"""
+    if segmentation not in SEGMENTATIONS[1:] or len(X) == 0:
+        return [], []
+    codes = segment_codes(X, segmentation)
+    order = np.argsort(codes, kind='stable')
+    groups = [group for group in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+              if len(group) >= min_samples]
+    return [int(codes[group[0]]) for group in groups], [X[group] for group in groups]
+
+def segment_models(codes: List[int], matrices: List[np.ndarray], fitted: List[Tuple]) -> Dict[int, SegmentModel]:
+    return {
+        code: SegmentModel(scaler, FlatIsolationForest.from_estimator(detector), len(matrix))
+        for code, matrix, (scaler, detector) in zip(codes, matrices, fitted)
+    }
+
+def fit_model_bundle(X: np.ndarray, watermark: Optional[datetime], reservoir_size: int,
+                     segmentation: str = 'global', workers: int = 1, min_samples: int = 50) -> ModelBundle:
+    """Entraîner un nouvel ensemble de modèles sur tout l'historique"""
+    # Modèle global (repli des segments peu représentés) et modèles par segment, entraînés ensemble
+    codes, matrices = segment_matrices(X, segmentation, min_samples)
+    (scaler, anomaly_detector), *fitted = fit_detectors([X] + matrices, workers)
+    segments = segment_models(codes, matrices, fitted)
+    
+    # Échantillon réservoir pour l'entraînement incrémental
+    reservoir = X[np.random.default_rng().permutation(len(X))[:reservoir_size]]
+    
+    return ModelBundle(new_model_version(), scaler, anomaly_detector, reservoir,
+                       len(X), watermark, datetime.now(), FlatIsolationForest.from_estimator(anomaly_detector),
+                       segmentation, segments)
+
+def refit_model_bundle(base: ModelBundle, X_new: np.ndarray, watermark: Optional[datetime],
+                       reservoir_size: int, segmentation: str = 'global', workers: int = 1,
+                       min_samples: int = 50) -> ModelBundle:
+    """Mettre à jour un ensemble de modèles avec de nouveaux incidents"""
+    from sklearn.base import clone
+    
+    # Statistiques du scaler mises à jour sur une copie
+    scaler = copy.deepcopy(base.scaler)
+    scaler.partial_fit(X_new)
+    
+    # Réservoir mis à jour puis détecteur réentraîné sur l'échantillon
+    reservoir = update_reservoir(base.reservoir, base.samples_seen, X_new, reservoir_size,
+                                 np.random.default_rng())
+    anomaly_detector = clone(base.anomaly_detector)
+    anomaly_detector.fit(scaler.transform(reservoir))
+    
+    # Modèles par segment réentraînés sur l'échantillon réservoir ; les segments trop
+    # peu représentés dans le réservoir gardent le modèle de la version de base
+    codes, matrices = segment_matrices(reservoir, segmentation, min_samples)
+    segments = segment_models(codes, matrices, fit_detectors(matrices, workers))
+    if base.segmentation == segmentation:
+        carried = {code: segment for code, segment in base.segments.items() if code not in segments}
+        if carried:
+            logger.info(f"Segments conservés sans réentraînement (réservoir insuffisant): {len(carried)}")
+        segments = {**carried, **segments}
+    
+    if base.watermark is not None and (watermark is None or base.watermark > watermark):
+        watermark = base.watermark
+    
+    return ModelBundle(new_model_version(), scaler, anomaly_detector, reservoir,
+                       base.samples_seen + len(X_new), watermark, datetime.now(),
+                       FlatIsolationForest.from_estimator(anomaly_detector), segmentation, segments)
+
+def save_model_bundle(bundle: ModelBundle, models_dir: str = 'models', keep: int = 3):
+    """Écrire un ensemble de modèles sur disque puis le publier comme version courante"""
+    path = os.path.join(models_dir, 'bundles', bundle.version)
+    os.makedirs(path, exist_ok=True)
+    joblib.dump(bundle.anomaly_detector, os.path.join(path, 'anomaly_detector.pkl'))
+    joblib.dump(bundle.scaler, os.path.join(path, 'scaler.pkl'))
+    np.save(os.path.join(path, 'reservoir.npy'), bundle.reservoir)
+    if bundle.anomaly_engine is not None:
+        bundle.anomaly_engine.save(os.path.join(path, 'anomaly_forest.npz'))
+    
+    # Un répertoire par segment : scaler et forêt compilée (rechargement rapide, sans détecteur)
+    for code, segment in bundle.segments.items():
+        segment_path = os.path.join(path, 'segments', segment_name(code, bundle.segmentation))
+        os.makedirs(segment_path, exist_ok=True)
+        joblib.dump(segment.scaler, os.path.join(segment_path, 'scaler.pkl'))
+        segment.anomaly_engine.save(os.path.join(segment_path, 'anomaly_forest.npz'))
+    
+    state = {
+        'version': bundle.version,
+        'watermark': bundle.watermark.isoformat() if bundle.watermark else None,
+        'samples_seen': bundle.samples_seen,
+        'trained_at': bundle.trained_at.isoformat(),
+        'segmentation': bundle.segmentation,
+        'segments': {segment_name(code, bundle.segmentation): {'code': code, 'samples': segment.samples}
+                     for code, segment in bundle.segments.items()}
+    }
+    with open(os.path.join(path, 'training_state.json'), 'w') as f:
+        json.dump(state, f)
+    
+    # Publication atomique du pointeur de version courante
+    pointer = os.path.join(models_dir, 'current')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(bundle.version)
+    os.replace(pointer + '.tmp', pointer)
+    
+    # Conserver uniquement les versions les plus récentes
+    versions = sorted(os.listdir(os.path.join(models_dir, 'bundles')))
+    for old_version in versions[:-keep]:
+        if old_version != bundle.version:
+            shutil.rmtree(os.path.join(models_dir, 'bundles', old_version), ignore_errors=True)
+
+def current_model_version(models_dir: str = 'models') -> Optional[str]:
+    """Lire la version courante publiée sur disque"""
+    try:
+        with open(os.path.join(models_dir, 'current')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_model_bundle(models_dir: str = 'models', version: Optional[str] = None) -> Optional[ModelBundle]:
+    """Charger un ensemble de modèles (version courante par défaut)"""
+    version = version or current_model_version(models_dir)
+    if version is None:
+        # Ancien format : modèles à plat dans models/
+        path = models_dir
+        if not os.path.exists(os.path.join(path, 'anomaly_detector.pkl')):
+            return None
+    else:
+        path = os.path.join(models_dir, 'bundles', version)
+    
+    state = {}
+    if os.path.exists(os.path.join(path, 'training_state.json')):
+        with open(os.path.join(path, 'training_state.json')) as f:
+            state = json.load(f)
+    reservoir_path = os.path.join(path, 'reservoir.npy')
+    anomaly_detector = joblib.load(os.path.join(path, 'anomaly_detector.pkl'))
+    
+    # Forêt compilée enregistrée avec le détecteur (exportée au chargement pour les anciennes versions)
+    engine_path = os.path.join(path, 'anomaly_forest.npz')
+    try:
+        anomaly_engine = FlatIsolationForest.load(engine_path)
+    except (OSError, ValueError, KeyError):
+        anomaly_engine = FlatIsolationForest.from_estimator(anomaly_detector)
+    
+    segments = {}
+    for name, segment in state.get('segments', {}).items():
+        segment_path = os.path.join(path, 'segments', name)
+        segments[int(segment['code'])] = SegmentModel(
+            joblib.load(os.path.join(segment_path, 'scaler.pkl')),
+            FlatIsolationForest.load(os.path.join(segment_path, 'anomaly_forest.npz')),
+            int(segment['samples'])
+        )
+    
+    return ModelBundle(
+        version=version or 'legacy',
+        scaler=joblib.load(os.path.join(path, 'scaler.pkl')),
+        anomaly_detector=anomaly_detector,
+        reservoir=np.load(reservoir_path) if os.path.exists(reservoir_path) else np.empty((0, 11)),
+        samples_seen=state.get('samples_seen', 0),
+        watermark=datetime.fromisoformat(state['watermark']) if state.get('watermark') else None,
+        trained_at=datetime.fromisoformat(state['trained_at']) if state.get('trained_at') else datetime.now(),
+        anomaly_engine=anomaly_engine,
+        segmentation=state.get('segmentation', 'global'),
+        segments=segments
+    )
+
+def acquire_file_lock(path: str, blocking: bool = True):
+    """Prendre un verrou exclusif sur un fichier (le verrou vit tant que le fichier retourné est ouvert)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    lock_file = open(path, 'a+')
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def run_training_job(kind: str, settings: Dict) -> Optional[str]:
+    """Entraîner et publier un ensemble de modèles (exécuté dans un processus séparé)"""
+    models_dir = settings['models_dir']
+    # Un seul entraînement à la fois, même si plusieurs workers en soumettent
+    lock_file = acquire_file_lock(os.path.join(models_dir, 'training.lock'))
+    client = MongoClient(settings['mongo_url'], **settings['mongo_options'])
+    try:
+        base = load_model_bundle(models_dir) if kind == 'incremental' else None
+        if base is not None and base.watermark is None:
+            base = None
+        snapshot = None
+        if settings['snapshot_dir']:
+            snapshot = IncidentSnapshotStore(settings['snapshot_dir'],
+                                             max_age=timedelta(hours=settings['snapshot_max_age_hours']))
+        
+        incidents = load_incident_history(client.disaster_db.incidents, base.watermark if base else None,
+                                          chunk_size=settings['fetch_batch_size'], with_ids=False,
+                                          snapshot=snapshot)
+        if base is None and len(incidents) < 10:
+            logger.warning("Pas assez de données pour l'entraînement")
+            return None
+        if len(incidents) == 0:
+            return base.version
+        
+        if os.path.exists(settings['population_grid_path']):
+            density = PopulationDensityProvider.from_file(settings['population_grid_path'])
+        else:
+            density = PopulationDensityProvider.simulated()
+        X = build_feature_matrix(incidents, density.densities)
+        watermark = incidents.timestamps.max().item()
+        
+        if base is None:
+            bundle = fit_model_bundle(X, watermark, settings['reservoir_size'], **settings['segmentation'])
+        else:
+            bundle = refit_model_bundle(base, X, watermark, settings['reservoir_size'], **settings['segmentation'])
+        
+        save_model_bundle(bundle, models_dir)
+        logger.info(f"Modèles {bundle.version} entraînés ({kind}) sur {len(X)} incidents")
+        return bundle.version
+    finally:
+        client.close()
+        lock_file.close()
+
+class TrainingJobManager:
+    """Exécution des entraînements dans un processus séparé, avec suivi des tâches"""
+    
+    def __init__(self, on_published: Callable[[str], None], max_history: int = 50,
+                 jobs_dir: Optional[str] = None, metrics: Optional[Metrics] = None):
+        self.on_published = on_published
+        self.metrics = metrics or Metrics(enabled=False)
+        self.max_history = max_history
+        self.jobs_dir = jobs_dir  # État des tâches partagé entre workers
+        self.executor = None
+        self.jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self.futures: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # 'spawn' : le processus d'entraînement n'hérite pas des threads du service
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+    
+    def submit(self, kind: str, settings: Dict) -> Dict:
+        """Soumettre un entraînement (réutilise une tâche identique déjà en attente)"""
+        with self.lock:
+            for job_id, job in self.jobs.items():
+                if job['kind'] == kind and not self.futures[job_id].running() and job['status'] == 'queued':
+                    return self.describe(job_id)
+            
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'kind': kind,
+                'status': 'queued',
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'model_version': None,
+                'error': None
+            }
+            try:
+                future = self._get_executor().submit(run_training_job, kind, settings)
+            except BrokenProcessPool:
+                self.executor = None
+                future = self._get_executor().submit(run_training_job, kind, settings)
+            self.futures[job_id] = future
+            self._persist(job_id)
+            
+            # Oublier les tâches les plus anciennes
+            while len(self.jobs) > self.max_history:
+                old_id, _ = self.jobs.popitem(last=False)
+                self.futures.pop(old_id, None)
+                if self.jobs_dir:
+                    try:
+                        os.remove(os.path.join(self.jobs_dir, f"{old_id}.json"))
+                    except OSError:
+                        pass
+        
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return self.describe(job_id)
+    
+    def _persist(self, job_id: str):
+        if not self.jobs_dir or job_id not in self.jobs:
+            return
+        try:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            path = os.path.join(self.jobs_dir, f"{job_id}.json")
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(self.jobs[job_id], f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"État de la tâche {job_id} non persisté: {e}")
+    
+    def _finish(self, job_id: str, future: Future):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        try:
+            version = future.result()
+            job['model_version'] = version
+            if version is not None:
+                self.on_published(version)
+            job['status'] = 'succeeded'
+        except Exception as e:
+            logger.error(f"Erreur lors de l'entraînement {job_id}: {e}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        job['finished_at'] = datetime.now().isoformat()
+        self._persist(job_id)
+        
+        # Durée totale de la tâche (attente comprise)
+        duration = (datetime.now() - datetime.fromisoformat(job['submitted_at'])).total_seconds()
+        self.metrics.observe('stage_seconds', duration, stage=f"training_job_{job['kind']}")
+        self.metrics.increment('training_jobs_total', kind=job['kind'], status=job['status'])
+    
+    def describe(self, job_id: str) -> Optional[Dict]:
+        """État courant d'une tâche d'entraînement"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            # Tâche soumise par un autre worker
+            if not self.jobs_dir or not job_id.isalnum():
+                return None
+            try:
+                with open(os.path.join(self.jobs_dir, f"{job_id}.json")) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return None
+        job = dict(job)
+        future = self.futures.get(job_id)
+        if job['status'] == 'queued' and future is not None and future.running():
+            job['status'] = 'running'
+        return job
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None):
+        """Attendre la fin d'une tâche"""
+        future = self.futures.get(job_id)
+        if future is not None:
+            wait([future], timeout=timeout)
+
+def incident_record_from_event(event: Dict) -> Dict:
+    """Convertir un événement 'incident.created' (document MongoDB sérialisé) en incident de l'API
+    
+    L'incident est validé ici (date comprise) : un événement mal formé est rejeté seul,
+    sans invalider le micro-lot qui le contient.
+    """
+    incident = event.get('incident', event)
+    coordinates = (incident.get('location') or {}).get('coordinates')
+    if coordinates:
+        longitude, latitude = coordinates[:2]
+    else:
+        latitude, longitude = incident['latitude'], incident['longitude']
+    timestamp = incident.get('createdAt') or incident.get('timestamp')
+    if timestamp is None:
+        # Date de réception, en UTC comme parse_timestamps
+        timestamp = datetime.now(timezone.utc).isoformat()
+    return validate_incident_record({
+        'id': str(incident.get('_id', incident.get('id', ''))),
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'category': incident.get('category', 'other'),
+        'severity': int(incident['severity']),
+        'timestamp': timestamp
+    })
+
+class IncidentStreamConsumer:
+    """Notation en temps réel des incidents publiés sur Redis
+    
+    Les événements sont regroupés en micro-lots (taille maximale ou délai depuis le
+    premier événement en attente), notés par detect, et les anomalies sont publiées sur
+    output_channel pour le service de notifications.
+    """
+    
+    def __init__(self, redis_client, detect: Callable[[IncidentBatch], Tuple[List[Dict], Optional[str]]],
+                 input_channel: str = 'incidents:created', output_channel: str = 'ai:anomalies',
+                 batch_size: int = 100, max_delay: float = 0.2, metrics: Optional[Metrics] = None,
+                 stats_key: Optional[str] = 'ai:consumer:stats'):
+        self.redis_client = redis_client
+        self.detect = detect
+        self.input_channel = input_channel
+        self.output_channel = output_channel
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.metrics = metrics or Metrics(enabled=False)
+        self.stats_key = stats_key  # État partagé avec les autres workers
+        self.stats = {'received': 0, 'invalid': 0, 'scored': 0, 'unscored': 0, 'batches': 0,
+                      'anomalies': 0, 'published': 0, 'errors': 0}
+        self.latencies = deque(maxlen=10000)  # Réception -> publication (secondes)
+        self.started_at = None
+        self.stats_saved_at = 0.0
+        self.thread = None
+        self.stop_event = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self):
+        """Consommer les événements dans une thread de fond"""
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='incident-consumer')
+        self.thread.start()
+    
+    def stop(self, timeout: Optional[float] = None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+    
+    def run(self):
+        """Boucle d'abonnement (réabonnement après une perte de connexion)"""
+        self.started_at = time.time()
+        logger.info(f"Consommation des incidents publiés sur {self.input_channel}")
+        while not self.stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.input_channel)
+                self.consume(pubsub)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Erreur de l'abonnement {self.input_channel}: {e}")
+                self.stop_event.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    def consume(self, pubsub):
+        """Lire les messages et déclencher la notation par taille de lot ou délai"""
+        pending: List[Tuple[Dict, float]] = []  # (incident, instant de réception)
+        deadline = None
+        while not self.stop_event.is_set():
+            timeout = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            message = pubsub.get_message(timeout=timeout)
+            now = time.monotonic()
+            
+            if message is not None and message['type'] == 'message':
+                self.stats['received'] += 1
+                try:
+                    pending.append((incident_record_from_event(json.loads(message['data'])), now))
+                    if deadline is None:
+                        deadline = now + self.max_delay
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    self.stats['invalid'] += 1
+                    self.metrics.increment('stream_events_total', status='invalid')
+            
+            if pending and (len(pending) >= self.batch_size or now >= deadline):
+                self.flush(pending)
+                pending, deadline = [], None
+        
+        if pending:
+            self.flush(pending)
+    
+    def flush(self, pending: List[Tuple[Dict, float]]):
+        """Noter un micro-lot et publier ses anomalies"""
+        try:
+            incidents = IncidentBatch.from_records([record for record, _ in pending])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Micro-lot de {len(pending)} incidents rejeté: {e}")
+            self.stats['invalid'] += len(pending)
+            self.metrics.increment('stream_events_total', len(pending), status='invalid')
+            return
+        
+        with self.metrics.timer('stream_score'):
+            anomalies, version = self.detect(incidents)
+        self.metrics.observe('batch_size', len(incidents), endpoint='incident_consumer')
+        
+        if anomalies:
+            payload = {
+                'anomalies': anomalies,
+                'model_version': version,
+                'detected_at': datetime.now().isoformat()
+            }
+            try:
+                self.redis_client.publish(self.output_channel, json.dumps(payload, default=str))
+                self.stats['published'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Erreur lors de la publication des anomalies: {e}")
+        
+        done = time.monotonic()
+        status = 'scored' if version is not None else 'unscored'  # Aucun modèle chargé
+        self.stats[status] += len(pending)
+        self.stats['batches'] += 1
+        self.stats['anomalies'] += len(anomalies)
+        self.metrics.increment('stream_events_total', len(pending), status=status)
+        for _, received_at in pending:
+            self.latencies.append(done - received_at)
+            self.metrics.observe('stream_latency_seconds', done - received_at)
+        
+        if self.stats_key and time.time() - self.stats_saved_at >= 1.0:
+            self.save_stats()
+    
+    def describe(self) -> Dict:
+        """Compteurs, débit et latence de bout en bout (ms) du consommateur"""
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        summary = {
+            'running': self.running,
+            'pid': os.getpid(),
+            'input_channel': self.input_channel,
+            'output_channel': self.output_channel,
+            'batch_size': self.batch_size,
+            'max_delay_ms': self.max_delay * 1000,
+            **self.stats,
+            'uptime_seconds': round(elapsed, 3),
+            'throughput_per_s': round(self.stats['scored'] / elapsed, 2) if elapsed else 0.0
+        }
+        for q in (50, 95, 99):
+            summary[f'latency_p{q}_ms'] = round(float(np.percentile(latencies, q)), 3) if len(latencies) else None
+        return summary
+    
+    def save_stats(self):
+        try:
+            self.redis_client.setex(self.stats_key, 60, json.dumps(self.describe()))
+            self.stats_saved_at = time.time()
+        except Exception as e:
+            logger.warning(f"Statistiques du consommateur non publiées: {e}")
+    
+    def load_stats(self) -> Optional[Dict]:
+        """Statistiques publiées par le processus consommateur (autre worker)"""
+        if not self.stats_key:
+            return None
+        try:
+            cached = self.redis_client.get(self.stats_key)
+        except Exception:
+            return None
+        return json.loads(cached) if cached else None
+
 class DisasterAIService:
     """Service principal pour l'analyse IA des catastrophes"""
     
-    def __init__(self):
+    def __init__(self, mongo_client: Optional[MongoClient] = None, redis_client: Optional[redis.Redis] = None,
+                 start_background: bool = True):
+        init_started = time.perf_counter()
         self.app = Flask(__name__)
         CORS(self.app)
+        self.app.extensions['disaster_ai'] = self
         
-        # Configuration des bases de données
-        self.mongo_client = MongoClient(os.getenv('MONGODB_URL', 'mongodb://localhost:27017/disaster_db'))
-        self.db = self.mongo_client.disaster_db
-        self.redis_client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+        # Instrumentation (latences par étape, compteurs) exposée sur /metrics
+        self.metrics = Metrics(enabled=os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+        
+        # Configuration des bases de données (clients injectables)
+        self.mongo_url = os.getenv('MONGODB_URL', 'mongodb://localhost:27017/disaster_db')
+        self.redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
+        
+        # Pool de connexions MongoDB et délais (connexion, sélection du serveur, requêtes)
+        self.mongo_pool_size = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+        self.mongo_timeout_ms = int(os.getenv('MONGO_TIMEOUT_MS', '5000'))
+        self.mongo_query_timeout_ms = int(os.getenv('MONGO_QUERY_TIMEOUT_MS', '2000'))
+        
+        # Requêtes de proximité MongoDB concurrentes (pool de threads borné)
+        self.nearby_concurrency = min(int(os.getenv('NEARBY_QUERY_CONCURRENCY', '16')), self.mongo_pool_size)
+        self._nearby_executor = None
+        self._nearby_executor_lock = threading.Lock()
+        self._nearby_state = threading.local()  # Échecs des requêtes de proximité, par thread
         
-        # Modèles IA
-        self.anomaly_detector = None
+        self.connect(mongo_client, redis_client)
+        
+        # Modèles IA (ensemble immuable, remplacé atomiquement après chaque entraînement)
+        self.models: Optional[ModelBundle] = None
         self.risk_predictor = None
-        self.scaler = StandardScaler()
         
-        # Cache pour les prédictions
-        self.prediction_cache = {}
-        self.cache_expiry = 3600  # 1 heure
+        # Cache pour les prédictions
+        self.cache_expiry = 3600  # 1 heure
+        self.prediction_cache = PredictionCache(
+            self.redis_client,
+            ttl=self.cache_expiry,
+            max_entries=int(os.getenv('RISK_CACHE_MAX_ENTRIES', '256')),
+            tile_size=float(os.getenv('RISK_CACHE_TILE_SIZE', '0.01'))
+        )
+        self.metrics.add_collector(
+            lambda: [('prediction_cache_events_total', {'event': event}, count)
+                     for event, count in self.prediction_cache.stats.items()]
+        )
+        
+        # Requêtes identiques simultanées (tableaux de bord ouverts ensemble) : un seul calcul
+        self.flights = {'predict-risk-zones': SingleFlight(), 'cluster-incidents': SingleFlight()}
+        self.metrics.add_collector(
+            lambda: [metric for endpoint, flight in self.flights.items() for metric in (
+                ('singleflight_in_flight', {'endpoint': endpoint}, flight.in_flight),
+                ('singleflight_requests_total', {'endpoint': endpoint, 'event': 'executed'},
+                 flight.stats['executions']),
+                ('singleflight_requests_total', {'endpoint': endpoint, 'event': 'coalesced'},
+                 flight.stats['coalesced'])
+            )]
+        )
+        
+        # Index spatial en mémoire pour les recherches de proximité
+        # ('memory' = index local, 'mongo' = requêtes $near sur MongoDB,
+        # 'aggregates' = risque point par point sur les agrégats geohash, approché,
+        # documents par requêtes $near)
+        self.nearby_backend = os.getenv('NEARBY_INCIDENTS_BACKEND', 'memory')
+        if self.nearby_backend not in ('memory', 'mongo', 'aggregates'):
+            logger.warning(f"Backend de proximité inconnu {self.nearby_backend}, index en mémoire utilisé")
+            self.nearby_backend = 'memory'
+        self.spatial_index = SpatialIndex()
+        self.index_refresh_interval = int(os.getenv('SPATIAL_INDEX_REFRESH_INTERVAL', '60'))
+        # Reconstruction complète sur chaque worker (suppressions et modifications) : à chaque
+        # nouvelle génération de l'instantané, sinon à intervalle fixe
+        self.index_rebuild_interval = float(os.getenv('SPATIAL_INDEX_REBUILD_HOURS', '24')) * 3600
+        self.index_generation = None
+        self.index_rebuilt_at = time.monotonic()
+        
+        # Agrégats par cellule geohash pour le calcul du risque point par point
+        # (maintenus uniquement pour le backend 'aggregates')
+        self.risk_aggregates = RiskAggregateStore(precision=int(os.getenv('RISK_AGGREGATE_PRECISION', '6')))
+        
+        # Taille des blocs de lecture de l'historique
+        self.fetch_batch_size = int(os.getenv('HISTORICAL_FETCH_BATCH_SIZE', '5000'))
+        
+        # Taille des micro-lots du scoring en flux (NDJSON)
+        self.stream_batch_size = int(os.getenv('STREAM_BATCH_SIZE', '1000'))
+        
+        # Densité de population (raster sur disque ou simulation précalculée)
+        self.population_grid_path = os.getenv('POPULATION_GRID_PATH', 'models/population_density.npz')
+        self._population_density = None
+        
+        # Moteur de grille de risque vectorisé
+        self.risk_engine = RiskGridEngine()
+        self.clustering_engine = ClusteringEngine(
+            eps_meters=float(os.getenv('CLUSTER_EPS_METERS', '1000')),
+            min_samples=int(os.getenv('CLUSTER_MIN_SAMPLES', '2'))
+        )
+        self.default_grid_resolution = 20
+        self.max_grid_resolution = int(os.getenv('MAX_GRID_RESOLUTION', '500'))
+        
+        # Zones à risque sous échéance : grille grossière raffinée tant que le temps le permet
+        # (échéance par défaut appliquée aux requêtes qui n'en précisent pas ; 0 = aucune)
+        self.coarse_grid_resolution = max(int(os.getenv('RISK_ZONES_COARSE_RESOLUTION', '9')), 2)
+        self.default_deadline_ms = float(os.getenv('RISK_ZONES_DEADLINE_MS', '0')) or None
+        
+        # Entraînement incrémental ('full' = réentraînement complet toutes les 24h,
+        # 'incremental' = mise à jour à partir des nouveaux incidents)
+        self.training_mode = os.getenv('TRAINING_MODE', 'full')
+        self.incremental_interval = int(os.getenv('INCREMENTAL_TRAINING_INTERVAL', '600'))
+        self.reservoir_size = int(os.getenv('TRAINING_RESERVOIR_SIZE', '50000'))
+        self.training_lock = threading.Lock()
+        
+        # Détecteurs par segment ('global', 'category' ou 'category_region'), entraînés en parallèle
+        self.anomaly_segmentation = os.getenv('ANOMALY_SEGMENTATION', 'global')
+        if self.anomaly_segmentation not in SEGMENTATIONS:
+            logger.warning(f"Segmentation inconnue {self.anomaly_segmentation}, modèle global utilisé")
+            self.anomaly_segmentation = 'global'
+        self.training_workers = int(os.getenv('TRAINING_WORKERS', '0')) or os.cpu_count() or 1
+        self.segment_min_samples = int(os.getenv('SEGMENT_MIN_SAMPLES', '50'))
+        
+        # Entraînements hors du chemin des requêtes, dans un processus séparé
+        self.models_dir = 'models'
+        
+        # Instantané colonnaire de l'historique sur disque : redémarrages et réentraînements
+        # sans relecture complète de MongoDB (seuls les nouveaux incidents sont lus)
+        self.snapshot_store = None
+        if os.getenv('INCIDENT_SNAPSHOT_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self.snapshot_store = IncidentSnapshotStore(
+                os.getenv('INCIDENT_SNAPSHOT_DIR', os.path.join(self.models_dir, 'snapshot')),
+                max_age=timedelta(hours=float(os.getenv('INCIDENT_SNAPSHOT_MAX_AGE_HOURS', '24'))),
+                min_sync_interval=float(os.getenv('INCIDENT_SNAPSHOT_SYNC_INTERVAL', '30')),
+                metrics=self.metrics
+            )
+        self.training_jobs = TrainingJobManager(on_published=self.load_published_models,
+                                                jobs_dir=os.path.join(self.models_dir, 'jobs'),
+                                                metrics=self.metrics)
+        
+        # Pyramide de tuiles de risque (générée par le processus entraîneur, servie par tous)
+        self.tiles_enabled = os.getenv('RISK_TILES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.tile_pyramid = RiskTilePyramid(
+            os.path.join(self.models_dir, 'tiles'),
+            min_zoom=int(os.getenv('RISK_TILES_MIN_ZOOM', '5')),
+            max_zoom=int(os.getenv('RISK_TILES_MAX_ZOOM', '9')),
+            cells=int(os.getenv('RISK_TILES_CELLS', '64')),
+            workers=int(os.getenv('RISK_TILES_WORKERS', '0')) or None
+        )
+        self.tile_refresh_interval = int(os.getenv('RISK_TILES_REFRESH_INTERVAL', '300'))
+        
+        # Plusieurs workers : un seul processus élu (verrou fichier) entraîne les modèles,
+        # les autres chargent les nouvelles versions publiées dans models/current
+        self.model_poll_interval = int(os.getenv('MODEL_POLL_INTERVAL', '10'))
+        self.trainer_lock_file = None
+        
+        # Notation en temps réel des incidents publiés sur Redis (un seul worker élu consomme)
+        self.consumer_enabled = os.getenv('INCIDENT_CONSUMER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.consumer_lock_file = None
+        self.incident_consumer = IncidentStreamConsumer(
+            self.redis_client,
+            self.score_incident_events,
+            input_channel=os.getenv('INCIDENT_EVENTS_CHANNEL', 'incidents:created'),
+            output_channel=os.getenv('ANOMALY_EVENTS_CHANNEL', 'ai:anomalies'),
+            batch_size=int(os.getenv('CONSUMER_BATCH_SIZE', '100')),
+            max_delay=float(os.getenv('CONSUMER_MAX_DELAY_MS', '200')) / 1000,
+            metrics=self.metrics
+        )
+        
+        # Démarrage rapide : modèles persistés servis immédiatement, entraînement en arrière-plan
+        self.fast_start = os.getenv('AI_FAST_START', 'true').lower() in ('1', 'true', 'yes')
+        self.startup_budget = float(os.getenv('STARTUP_TIME_BUDGET', '5'))
+        self.first_request_budget = float(os.getenv('FIRST_REQUEST_TIME_BUDGET', '1'))
+        self.startup_metrics = {'import_seconds': round(IMPORT_SECONDS, 3)}
         
         # Initialiser les modèles
-        self.initialize_models()
+        self.initialize_models(start_background)
         
         # Configurer les routes Flask
         self.setup_routes()
         
         # Démarrer le processus de mise à jour périodique
-        self.start_background_tasks()
+        # (dans chaque worker après le fork pour un serveur pré-fork, voir create_app)
+        if start_background:
+            self.start_background_tasks()
+        
+        self.record_startup(time.perf_counter() - init_started)
+    
+    def connect(self, mongo_client: Optional[MongoClient] = None, redis_client: Optional[redis.Redis] = None):
+        """Créer les connexions MongoDB et Redis"""
+        self.mongo_client = mongo_client or MongoClient(self.mongo_url, **self.mongo_client_options())
+        self.db = self.mongo_client.disaster_db
+        self.redis_client = redis_client or redis.Redis.from_url(self.redis_url)
+    
+    def mongo_client_options(self) -> Dict:
+        """Taille du pool et délais des clients MongoDB (service et processus d'entraînement)"""
+        return {
+            'maxPoolSize': self.mongo_pool_size,
+            'connectTimeoutMS': self.mongo_timeout_ms,
+            'serverSelectionTimeoutMS': self.mongo_timeout_ms,
+            'waitQueueTimeoutMS': self.mongo_timeout_ms,
+            'socketTimeoutMS': 2 * self.mongo_timeout_ms
+        }
     
-    def initialize_models(self):
+    def initialize_models(self, start_training: bool = True):
         """Initialiser les modèles d'IA"""
         try:
-            # Charger les modèles existants ou en créer de nouveaux
-            if os.path.exists('models/anomaly_detector.pkl'):
-                self.anomaly_detector = joblib.load('models/anomaly_detector.pkl')
-                logger.info("Modèle de détection d'anomalies chargé")
-            else:
-                self.anomaly_detector = IsolationForest(
-                    contamination=0.1,
-                    random_state=42,
-                    n_estimators=100
-                )
-                logger.info("Nouveau modèle de détection d'anomalies créé")
+            # Charger les modèles existants
+            self.models = load_model_bundle(self.models_dir)
+            if self.models is not None:
+                logger.info(f"Modèles chargés (version {self.models.version})")
+            
+            if not start_training:
+                return
             
-            if os.path.exists('models/scaler.pkl'):
-                self.scaler = joblib.load('models/scaler.pkl')
-                logger.info("Scaler chargé")
+            if self.fast_start:
+                # Index spatial préparé en arrière-plan, entraînement lancé par le processus élu
+                threading.Thread(target=self.warm_up, daemon=True).start()
+                return
             
             # Entraîner les modèles avec les données existantes
-            self.train_models()
+            if self.acquire_trainer_role():
+                self.train_models()
             
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation des modèles: {e}")
     
-    def fetch_historical_data(self) -> List[IncidentData]:
-        """Récupérer les données historiques depuis MongoDB"""
+    def acquire_trainer_role(self) -> bool:
+        """Devenir le processus chargé de l'entraînement, si aucun autre ne l'est"""
+        if self.trainer_lock_file is None:
+            self.trainer_lock_file = acquire_file_lock(os.path.join(self.models_dir, 'trainer.lock'),
+                                                       blocking=False)
+        return self.trainer_lock_file is not None
+    
+    def acquire_consumer_role(self, blocking: bool = False) -> bool:
+        """Devenir le processus consommateur des événements Redis, si aucun autre ne l'est"""
+        if self.consumer_lock_file is None:
+            self.consumer_lock_file = acquire_file_lock(os.path.join(self.models_dir, 'consumer.lock'),
+                                                        blocking=blocking)
+        return self.consumer_lock_file is not None
+    
+    def consume_incidents(self):
+        """Mode consommateur seul (sans API HTTP) : python ai_service.py consume"""
+        self.consumer_enabled = False  # Pas d'élection concurrente par le thread de suivi des modèles
+        logger.info("En attente du rôle de consommateur des incidents")
+        self.acquire_consumer_role(blocking=True)
+        if self.incident_consumer.running:
+            self.incident_consumer.thread.join()
+        else:
+            self.incident_consumer.run()
+    
+    def before_fork(self):
+        """Préparer le processus maître avant la création des workers"""
+        # Les connexions MongoDB ne doivent pas être partagées entre processus
+        self.mongo_client.close()
+        # Objets chargés (modèles, index) exclus du ramasse-miettes : pages partagées en copie sur écriture
+        gc.freeze()
+    
+    def after_fork(self):
+        """Initialiser un worker du serveur pré-fork"""
+        self.connect()
+        self.prediction_cache.redis_client = self.redis_client
+        self.incident_consumer.redis_client = self.redis_client
+        self._nearby_executor = None
+        self.start_background_tasks()
+    
+    def warm_up(self):
+        """Préparer en arrière-plan ce qui ralentirait les premières requêtes"""
         try:
-            incidents = []
-            cursor = self.db.incidents.find({})
-            
-            for doc in cursor:
-                incident = IncidentData(
-                    id=str(doc['_id']),
-                    latitude=doc['location']['coordinates'][1],
-                    longitude=doc['location']['coordinates'][0],
-                    category=doc['category'],
-                    severity=doc['severity'],
-                    timestamp=doc['createdAt'],
-                    weather_conditions=doc.get('metadata', {}).get('weather'),
-                    population_density=self.get_population_density(
-                        doc['location']['coordinates'][1],
-                        doc['location']['coordinates'][0]
-                    )
-                )
-                incidents.append(incident)
+            self.population_density
+            parse_timestamps(['1970-01-01T00:00:00'])  # Import de pandas
+            self.refresh_spatial_index(rebuild=True)
+        except Exception as e:
+            logger.error(f"Erreur lors du préchargement: {e}")
+    
+    def record_startup(self, init_seconds: float):
+        """Mesurer le démarrage et surveiller la latence de la première requête"""
+        self.startup_metrics['init_seconds'] = round(init_seconds, 3)
+        startup_seconds = IMPORT_SECONDS + init_seconds
+        if startup_seconds > self.startup_budget:
+            logger.warning(f"Démarrage en {startup_seconds:.2f}s, au-delà du budget de {self.startup_budget}s")
+        else:
+            logger.info(f"Service IA prêt en {startup_seconds:.2f}s (import {IMPORT_SECONDS:.2f}s)")
+        
+        @self.app.before_request
+        def start_request_timer():
+            if 'first_request_seconds' not in self.startup_metrics:
+                g.request_started = time.perf_counter()
+        
+        @self.app.after_request
+        def record_first_request(response):
+            if 'first_request_seconds' not in self.startup_metrics and 'request_started' in g:
+                latency = time.perf_counter() - g.request_started
+                self.startup_metrics['first_request_seconds'] = round(latency, 3)
+                if latency > self.first_request_budget:
+                    logger.warning(f"Première requête servie en {latency:.2f}s, "
+                                   f"au-delà du budget de {self.first_request_budget}s")
+            return response
+    
+    @property
+    def scaler(self) -> Optional['StandardScaler']:
+        return self.models.scaler if self.models else None
+    
+    @property
+    def anomaly_detector(self) -> Optional['IsolationForest']:
+        return self.models.anomaly_detector if self.models else None
+    
+    def swap_models(self, bundle: ModelBundle):
+        """Remplacer atomiquement l'ensemble de modèles utilisé pour le scoring"""
+        self.models = bundle
+        logger.info(f"Modèles version {bundle.version} en service")
+    
+    def load_published_models(self, version: str):
+        """Charger puis mettre en service une version publiée sur disque"""
+        if self.models is not None and self.models.version == version:
+            return
+        self.swap_models(load_model_bundle(self.models_dir, version))
+    
+    def training_settings(self) -> Dict:
+        """Paramètres transmis au processus d'entraînement"""
+        return {
+            'mongo_url': self.mongo_url,
+            'mongo_options': self.mongo_client_options(),
+            'models_dir': self.models_dir,
+            'population_grid_path': self.population_grid_path,
+            'fetch_batch_size': self.fetch_batch_size,
+            'reservoir_size': self.reservoir_size,
+            'segmentation': self.segmentation_settings(),
+            'snapshot_dir': self.snapshot_store.directory if self.snapshot_store else None,
+            'snapshot_max_age_hours': self.snapshot_store.max_age.total_seconds() / 3600 if self.snapshot_store else 24
+        }
+    
+    def segmentation_settings(self) -> Dict:
+        """Segmentation des détecteurs et parallélisme de leur entraînement"""
+        return {
+            'segmentation': self.anomaly_segmentation,
+            'workers': self.training_workers,
+            'min_samples': self.segment_min_samples
+        }
+    
+    def submit_training(self, kind: str = 'full') -> Dict:
+        """Lancer un entraînement en arrière-plan et retourner la tâche associée"""
+        return self.training_jobs.submit(kind, self.training_settings())
+    
+    @timed('fetch_historical_data')
+    def fetch_historical_data(self, since: Optional[datetime] = None) -> IncidentBatch:
+        """Récupérer les données historiques (instantané local synchronisé, sinon MongoDB)"""
+        try:
+            incidents = load_incident_history(self.db.incidents, since, chunk_size=self.fetch_batch_size,
+                                              snapshot=self.snapshot_store, metrics=self.metrics)
+            incidents.population_densities[:] = self.get_population_densities(
+                incidents.latitudes, incidents.longitudes
+            )
             
             logger.info(f"Récupéré {len(incidents)} incidents historiques")
             return incidents
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des données: {e}")
-            return []
+            return IncidentBatch.empty()
     
-    def get_population_density(self, lat: float, lng: float) -> float:
-        """Estimer la densité de population pour une coordonnée donnée"""
-        # Simulation basée sur les principales villes d'Algérie
-        major_cities = {
-            'alger': (36.7538, 3.0588, 3000),
-            'oran': (35.6969, -0.6331, 1500),
-            'constantine': (36.3650, 6.6147, 1200),
-            'annaba': (36.9000, 7.7667, 800),
-            'blida': (36.4203, 2.8277, 900),
-            'batna': (35.5559, 6.1741, 600),
-            'djelfa': (34.6714, 3.2631, 400),
-            'setif': (36.1906, 5.4137, 700),
-            'sidi_bel_abbes': (35.1908, -0.6307, 500),
-            'biskra': (34.8481, 5.7281, 450)
-        }
+    def refresh_spatial_index(self, rebuild: bool = False):
+        """Ajouter à l'index spatial les incidents créés depuis la dernière mise à jour"""
+        if rebuild:
+            # Reconstruction complète (prise en compte des suppressions)
+            generation = self.snapshot_store.generation() if self.snapshot_store else None
+            incidents = self.fetch_historical_data()
+            if len(incidents) > 0:
+                self.rebuild_spatial_index(incidents, generation)
+            return
+        
+        if not self.spatial_index.ready:
+            return
+        
+        try:
+            new_incidents = load_incident_history(self.db.incidents, self.spatial_index.watermark,
+                                                  chunk_size=self.fetch_batch_size, snapshot=self.snapshot_store,
+                                                  metrics=self.metrics)
+            
+            if len(new_incidents) > 0:
+                self.spatial_index.add(new_incidents)
+                if self.nearby_backend == 'aggregates':
+                    self.risk_aggregates.add(new_incidents)
+                self.prediction_cache.invalidate_points(new_incidents.latitudes, new_incidents.longitudes)
+                logger.info(f"Index spatial mis à jour: {len(new_incidents)} nouveaux incidents")
+                
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour de l'index spatial: {e}")
+    
+    def rebuild_spatial_index(self, incidents: IncidentBatch, generation: Optional[str]):
+        """Remplacer l'index spatial (et les agrégats) par l'historique complet"""
+        self.spatial_index.rebuild(incidents)
+        if self.nearby_backend == 'aggregates':
+            self.risk_aggregates.rebuild(incidents)
+        # Génération lue avant le chargement : une reconstruction concurrente de
+        # l'instantané provoque au pire une reconstruction de plus (sauf à la création)
+        if generation is None and self.snapshot_store is not None:
+            generation = self.snapshot_store.generation()
+        self.index_generation = generation
+        self.index_rebuilt_at = time.monotonic()
+    
+    def spatial_index_stale(self) -> bool:
+        """Reconstruction complète due (nouvelle génération de l'instantané ou intervalle écoulé)"""
+        if not self.spatial_index.ready:
+            return False
+        if self.snapshot_store is not None:
+            return self.snapshot_store.generation() != self.index_generation
+        return time.monotonic() - self.index_rebuilt_at >= self.index_rebuild_interval
+    
+    @timed('refresh_risk_tiles')
+    def refresh_risk_tiles(self, full: bool = False) -> int:
+        """Générer la pyramide de tuiles, ou seulement les tuiles proches des nouveaux incidents"""
+        if not self.spatial_index.ready:
+            return 0
         
-        min_distance = float('inf')
-        density = 100  # Densité par défaut pour les zones rurales
+        watermark = self.spatial_index.watermark
+        incidents = self.spatial_index.columns_within(-90, 90, -180, 180)
+        metadata = self.tile_pyramid.load_metadata()
         
-        for city, (city_lat, city_lng, city_density) in major_cities.items():
-            distance = np.sqrt((lat - city_lat)**2 + (lng - city_lng)**2)
-            if distance < min_distance:
-                min_distance = distance
-                # Densité décroît avec la distance
-                density = city_density * np.exp(-distance * 10)
+        # Régénération complète quotidienne : la part des incidents récents évolue avec le temps
+        if (full or metadata is None or metadata.get('watermark') is None or not metadata.get('generated_at')
+                or datetime.now() - datetime.fromisoformat(metadata['generated_at']) > timedelta(days=1)):
+            tiles = None
+        else:
+            recent = incidents['timestamps'] > np.datetime64(metadata['watermark'], 'ms')
+            if not recent.any():
+                return 0
+            tiles = self.tile_pyramid.tiles_touched(incidents['latitudes'][recent], incidents['longitudes'][recent],
+                                                    self.risk_engine.risk_radius)
         
-        return max(density, 50)  # Minimum 50 hab/km²
+        rendered = self.tile_pyramid.generate(incidents, tiles, watermark=watermark, engine=self.risk_engine,
+                                              population_grid_path=self.population_grid_path)
+        logger.info(f"Tuiles de risque {'générées' if tiles is None else 'mises à jour'}: {rendered}")
+        return rendered
+    
+    @property
+    def population_density(self) -> PopulationDensityProvider:
+        """Fournisseur de densité de population, chargé au premier usage"""
+        if self._population_density is None:
+            if os.path.exists(self.population_grid_path):
+                self._population_density = PopulationDensityProvider.from_file(self.population_grid_path)
+                logger.info(f"Raster de densité de population chargé: {self.population_grid_path}")
+            else:
+                self._population_density = PopulationDensityProvider.simulated()
+                logger.info("Raster de densité de population simulé précalculé")
+        return self._population_density
     
-    def prepare_features(self, incidents: List[IncidentData]) -> np.ndarray:
+    def get_population_density(self, lat: float, lng: float) -> float:
+        """Estimer la densité de population pour une coordonnée donnée"""
+        return float(self.population_density.densities(lat, lng))
+    
+    @timed('population_density')
+    def get_population_densities(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Estimer la densité de population pour un ensemble de coordonnées"""
+        return self.population_density.densities(lats, lngs)
+    
+    @timed('prepare_features')
+    def prepare_features(self, incidents: IncidentBatch) -> np.ndarray:
         """Préparer les caractéristiques pour l'entraînement"""
-        features = []
-        
-        for incident in incidents:
-            # Caractéristiques temporelles
-            hour = incident.timestamp.hour
-            day_of_week = incident.timestamp.weekday()
-            month = incident.timestamp.month
-            
-            # Caractéristiques géographiques
-            lat = incident.latitude
-            lng = incident.longitude
-            
-            # Caractéristiques de l'incident
-            severity = incident.severity
-            category_encoded = self.encode_category(incident.category)
-            
-            # Densité de population
-            pop_density = incident.population_density or self.get_population_density(lat, lng)
-            
-            # Conditions météorologiques (si disponibles)
-            temp = 25.0  # Température par défaut
-            humidity = 60.0  # Humidité par défaut
-            wind_speed = 10.0  # Vitesse du vent par défaut
-            
-            if incident.weather_conditions:
-                temp = incident.weather_conditions.get('temperature', 25.0)
-                humidity = incident.weather_conditions.get('humidity', 60.0)
-                wind_speed = incident.weather_conditions.get('windSpeed', 10.0)
-            
-            feature_vector = [
-                lat, lng, severity, category_encoded, pop_density,
-                hour, day_of_week, month, temp, humidity, wind_speed
-            ]
-            
-            features.append(feature_vector)
-        
-        return np.array(features)
+        if not isinstance(incidents, IncidentBatch):
+            incidents = IncidentBatch.from_incidents(incidents)
+        return build_feature_matrix(incidents, self.get_population_densities)
     
     def encode_category(self, category: str) -> int:
         """Encoder les catégories d'incidents en valeurs numériques"""
-        category_map = {
-            'earthquake': 1, 'flood': 2, 'fire': 3, 'storm': 4,
-            'landslide': 5, 'accident': 6, 'infrastructure': 7,
-            'health': 8, 'security': 9, 'other': 10
-        }
-        return category_map.get(category, 10)
+        return CATEGORY_CODES.get(category, 10)
     
+    @timed('train_models')
     def train_models(self):
         """Entraîner les modèles avec les données historiques"""
-        try:
-            incidents = self.fetch_historical_data()
-            
-            if len(incidents) < 10:
-                logger.warning("Pas assez de données pour l'entraînement")
-                return
-            
-            # Préparer les caractéristiques
-            X = self.prepare_features(incidents)
-            
-            # Normaliser les données
-            X_scaled = self.scaler.fit_transform(X)
-            
-            # Entraîner le détecteur d'anomalies
-            self.anomaly_detector.fit(X_scaled)
-            
-            # Sauvegarder les modèles
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(self.anomaly_detector, 'models/anomaly_detector.pkl')
-            joblib.dump(self.scaler, 'models/scaler.pkl')
-            
-            logger.info("Modèles entraînés et sauvegardés avec succès")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'entraînement: {e}")
+        with self.training_lock:
+            try:
+                generation = self.snapshot_store.generation() if self.snapshot_store else None
+                incidents = self.fetch_historical_data()
+                
+                # Reconstruire l'index spatial et les agrégats avec l'historique complet
+                # (lot vide si MongoDB est indisponible : conserver l'index et le repli MongoDB)
+                if len(incidents) > 0:
+                    self.rebuild_spatial_index(incidents, generation)
+                
+                if len(incidents) < 10:
+                    logger.warning("Pas assez de données pour l'entraînement")
+                    return
+                
+                # Préparer les caractéristiques
+                X = self.prepare_features(incidents)
+                
+                # Entraîner puis publier un nouvel ensemble de modèles
+                bundle = fit_model_bundle(X, incidents.timestamps.max().item(), self.reservoir_size,
+                                          **self.segmentation_settings())
+                save_model_bundle(bundle, self.models_dir)
+                self.swap_models(bundle)
+                
+                logger.info("Modèles entraînés et sauvegardés avec succès")
+                
+            except Exception as e:
+                logger.error(f"Erreur lors de l'entraînement: {e}")
     
-    def detect_anomalies(self, incidents: List[IncidentData]) -> List[Dict]:
-        """Détecter les anomalies dans les incidents"""
-        if not self.anomaly_detector:
-            return []
+    @timed('train_incremental')
+    def train_incremental(self):
+        """Mettre à jour les modèles avec les incidents créés depuis le dernier entraînement"""
+        base = self.models
+        if base is None or base.watermark is None:
+            # Pas de filigrane : un entraînement complet est nécessaire
+            self.train_models()
+            return
+        
+        with self.training_lock:
+            try:
+                incidents = self.fetch_historical_data(since=base.watermark)
+                if len(incidents) == 0:
+                    return
+                
+                X_new = self.prepare_features(incidents)
+                bundle = refit_model_bundle(base, X_new, incidents.timestamps.max().item(), self.reservoir_size,
+                                            **self.segmentation_settings())
+                save_model_bundle(bundle, self.models_dir)
+                self.swap_models(bundle)
+                
+                logger.info(f"Entraînement incrémental: {len(X_new)} nouveaux incidents, "
+                            f"réservoir de {len(bundle.reservoir)} échantillons")
+                
+            except Exception as e:
+                logger.error(f"Erreur lors de l'entraînement incrémental: {e}")
+    
+    def score_anomalies(self, incidents: IncidentBatch, models: Optional[ModelBundle] = None) -> Dict:
+        """Positions, scores et raisons des anomalies d'un lot"""
+        models = models or self.models  # Référence locale : insensible au remplacement des modèles
+        if models is None or len(incidents) == 0:
+            return {'positions': np.empty(0, dtype=np.int64), 'scores': np.empty(0), 'reasons': []}
+        
+        X = self.prepare_features(incidents)
+        
+        # Prédire les anomalies (-1 = anomalie, 1 = normal)
+        if models.segments:
+            predictions, scores = self.predict_by_segment(models, X)
+        else:
+            predictions, scores = self.predict_with_model(models.scaler, models.anomaly_engine,
+                                                          models.anomaly_detector, X)
         
+        positions = np.flatnonzero(predictions == -1)  # Anomalies détectées
+        return {
+            'positions': positions,
+            'scores': scores[positions],
+            'reasons': self.analyze_anomaly_reasons(X[positions])
+        }
+    
+    def score_incident_events(self, incidents: IncidentBatch) -> Tuple[List[Dict], Optional[str]]:
+        """Anomalies d'un micro-lot du consommateur Redis, avec la version des modèles utilisée"""
+        models = self.models
+        if models is None:
+            return [], None
+        return self.detect_anomalies(incidents, models), models.version
+    
+    def predict_by_segment(self, models: ModelBundle, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Évaluer chaque incident avec le modèle de son segment, par groupes"""
+        predictions = np.empty(len(X), dtype=np.int64)
+        scores = np.empty(len(X))
+        
+        codes = segment_codes(X, models.segmentation)
+        order = np.argsort(codes, kind='stable')
+        for group in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1):
+            segment = models.segments.get(int(codes[group[0]]))
+            if segment is None:
+                # Segment sans modèle dédié (historique insuffisant) : modèle global
+                predictions[group], scores[group] = self.predict_with_model(
+                    models.scaler, models.anomaly_engine, models.anomaly_detector, X[group]
+                )
+            else:
+                predictions[group], scores[group] = self.predict_with_model(
+                    segment.scaler, segment.anomaly_engine, None, X[group]
+                )
+        
+        return predictions, scores
+    
+    def predict_with_model(self, scaler: 'StandardScaler', engine: Optional[FlatIsolationForest],
+                           detector: Optional['IsolationForest'], X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Étiquettes et decision_function d'un scaler et d'un détecteur (forêt compilée si disponible)"""
+        with self.metrics.timer('scaler_transform'):
+            X_scaled = scaler.transform(X)
+        
+        with self.metrics.timer('anomaly_predict'):
+            if engine is not None:
+                return engine.predict_with_scores(X_scaled)
+            return detector.predict(X_scaled), detector.decision_function(X_scaled)
+    
+    def detect_anomalies(self, incidents: IncidentBatch, models: Optional[ModelBundle] = None) -> List[Dict]:
+        """Détecter les anomalies dans les incidents"""
         try:
-            X = self.prepare_features(incidents)
-            X_scaled = self.scaler.transform(X)
+            if not isinstance(incidents, IncidentBatch):
+                incidents = IncidentBatch.from_incidents(incidents)
             
-            # Prédire les anomalies (-1 = anomalie, 1 = normal)
-            predictions = self.anomaly_detector.predict(X_scaled)
-            scores = self.anomaly_detector.decision_function(X_scaled)
+            result = self.score_anomalies(incidents, models)
             
             anomalies = []
-            for i, (incident, pred, score) in enumerate(zip(incidents, predictions, scores)):
-                if pred == -1:  # Anomalie détectée
-                    anomalies.append({
-                        'incident_id': incident.id,
-                        'latitude': incident.latitude,
-                        'longitude': incident.longitude,
-                        'category': incident.category,
-                        'severity': incident.severity,
-                        'anomaly_score': float(score),
-                        'timestamp': incident.timestamp.isoformat(),
-                        'reasons': self.analyze_anomaly_reasons(incident, X_scaled[i])
-                    })
+            for position, score, incident_reasons in zip(result['positions'], result['scores'], result['reasons']):
+                anomalies.append({
+                    'incident_id': incidents.ids[position],
+                    'latitude': float(incidents.latitudes[position]),
+                    'longitude': float(incidents.longitudes[position]),
+                    'category': CATEGORY_NAMES[incidents.categories[position]],
+                    'severity': int(incidents.severities[position]),
+                    'anomaly_score': float(score),
+                    'timestamp': incidents.timestamps[position].item().isoformat() + 'Z',  # Dates normalisées en UTC
+                    'reasons': incident_reasons
+                })
             
             return anomalies
             
@@ -274,73 +3056,347 @@ class DisasterAIService:
             logger.error(f"Erreur lors de la détection d'anomalies: {e}")
             return []
     
-    def analyze_anomaly_reasons(self, incident: IncidentData, features: np.ndarray) -> List[str]:
-        """Analyser les raisons d'une anomalie"""
-        reasons = []
-        
-        # Analyser la gravité
-        if incident.severity >= 4:
-            reasons.append("Gravité élevée inhabituelle")
+    def analyze_anomaly_reasons(self, features: np.ndarray) -> List[List[str]]:
+        """Analyser les raisons des anomalies à partir de leurs caractéristiques"""
+        # Gravité, heure et densité de population de chaque anomalie
+        high_severity = features[:, 2] >= 4
+        unusual_hour = (features[:, 5] < 6) | (features[:, 5] > 22)
+        isolated = features[:, 4] < 100
         
-        # Analyser l'heure
-        hour = incident.timestamp.hour
-        if hour < 6 or hour > 22:
-            reasons.append("Heure inhabituelle")
-        
-        # Analyser la localisation (zones isolées)
-        pop_density = self.get_population_density(incident.latitude, incident.longitude)
-        if pop_density < 100:
-            reasons.append("Zone à faible densité de population")
+        reasons = []
+        for severe, night, remote in zip(high_severity, unusual_hour, isolated):
+            incident_reasons = []
+            if severe:
+                incident_reasons.append("Gravité élevée inhabituelle")
+            if night:
+                incident_reasons.append("Heure inhabituelle")
+            if remote:
+                incident_reasons.append("Zone à faible densité de population")
+            reasons.append(incident_reasons)
         
         return reasons
     
-    def predict_risk_zones(self, region_bounds: Dict) -> List[RiskPrediction]:
+    def predict_risk_zones(self, region_bounds: Dict, resolution=None) -> List[RiskPrediction]:
         """Prédire les zones à haut risque dans une région"""
         try:
-            # Générer une grille de points dans la région
-            lat_min, lat_max = region_bounds['lat_min'], region_bounds['lat_max']
-            lng_min, lng_max = region_bounds['lng_min'], region_bounds['lng_max']
+            # Emprise alignée sur les tuiles du cache
+            lat_min, lat_max = sorted((region_bounds['lat_min'], region_bounds['lat_max']))
+            lng_min, lng_max = sorted((region_bounds['lng_min'], region_bounds['lng_max']))
+            n_lat, n_lng = self.parse_grid_resolution(resolution)
+            bounds = self.prediction_cache.normalize_bounds(lat_min, lat_max, lng_min, lng_max)
+            cache_key = self.prediction_cache.make_key(bounds, (n_lat, n_lng))
             
-            # Grille de 20x20 points
-            lat_points = np.linspace(lat_min, lat_max, 20)
-            lng_points = np.linspace(lng_min, lng_max, 20)
+            cached = self.prediction_cache.get(cache_key)
+            if cached is not None:
+                return [RiskPrediction(**prediction) for prediction in cached]
             
-            predictions = []
+            def compute() -> List[RiskPrediction]:
+                failures = self.nearby_failures()
+                predictions = self.compute_risk_zones(bounds, n_lat, n_lng)
+                self.cache_risk_zones(cache_key, bounds, predictions, failures)
+                return predictions
             
-            for lat in lat_points:
-                for lng in lng_points:
-                    risk_level = self.calculate_risk_level(lat, lng)
-                    
-                    if risk_level > 0.3:  # Seuil de risque significatif
-                        prediction = RiskPrediction(
-                            latitude=lat,
-                            longitude=lng,
-                            risk_level=risk_level,
-                            risk_category=self.categorize_risk(risk_level),
-                            confidence=0.8,  # Confiance simulée
-                            factors=self.identify_risk_factors(lat, lng)
-                        )
-                        predictions.append(prediction)
-            
-            return predictions
+            return self.flights['predict-risk-zones'].do(cache_key, compute)
             
         except Exception as e:
             logger.error(f"Erreur lors de la prédiction des zones de risque: {e}")
             return []
     
-    def calculate_risk_level(self, lat: float, lng: float) -> float:
-        """Calculer le niveau de risque pour une coordonnée"""
-        # Récupérer les incidents historiques dans un rayon de 5km
-        nearby_incidents = self.get_nearby_incidents(lat, lng, 5000)
+    def cache_risk_zones(self, cache_key: str, bounds: Tuple[float, float, float, float],
+                         predictions: List[RiskPrediction], failures: int):
+        """Mettre en cache des zones à risque, sauf échec de requêtes de proximité depuis failures"""
+        if self.nearby_failures() > failures:
+            # Voisinages manquants (risque minimal à tort) : résultat servi, pas mis en cache
+            logger.warning(f"Zones à risque incomplètes pour {cache_key}, non mises en cache")
+            return
+        self.prediction_cache.set(cache_key, bounds, [asdict(prediction) for prediction in predictions])
+    
+    @timed('compute_risk_zones')
+    def compute_risk_zones(self, bounds: Tuple[float, float, float, float], n_lat: int,
+                           n_lng: int) -> List[RiskPrediction]:
+        """Calculer les zones à risque d'une emprise, sans cache"""
+        # Générer une grille de points dans la région
+        lat_min, lat_max, lng_min, lng_max = bounds
+        lat_points = np.linspace(lat_min, lat_max, n_lat)
+        lng_points = np.linspace(lng_min, lng_max, n_lng)
+        
+        # Calcul vectorisé à partir de l'index spatial en mémoire
+        if self.nearby_backend == 'memory' and self.spatial_index.ready:
+            return self.predict_risk_grid(lat_points, lng_points)
+        
+        points = [(lat, lng) for lat in lat_points for lng in lng_points]
+        risk_levels = self.point_risk_levels(points)
+        
+        significant = [(lat, lng, risk_level) for (lat, lng), risk_level in zip(points, risk_levels)
+                       if risk_level > 0.3]  # Seuil de risque significatif
+        return self.point_risk_predictions(significant)
+    
+    def point_risk_levels(self, points: List[Tuple[float, float]]) -> List[float]:
+        """Niveaux de risque d'une liste de points (agrégats, sinon requêtes de proximité)"""
+        # Sans agrégats : requêtes de proximité lancées en parallèle
+        # (latence de la requête la plus lente plutôt que de leur somme)
+        risk_incidents = None
+        if not self.aggregates_ready:
+            risk_incidents = self.get_nearby_incidents_many(points, 5000)
+        
+        return [self.calculate_risk_level(lat, lng, risk_incidents[i] if risk_incidents else None)
+                for i, (lat, lng) in enumerate(points)]
+    
+    def point_risk_predictions(self, significant: List[Tuple[float, float, float]]) -> List[RiskPrediction]:
+        """Convertir des points significatifs (lat, lng, risque) en prédictions avec leurs facteurs"""
+        factor_incidents = None
+        if not self.aggregates_ready:
+            factor_incidents = self.get_nearby_incidents_many([(lat, lng) for lat, lng, _ in significant], 10000)
+        
+        predictions = []
+        for i, (lat, lng, risk_level) in enumerate(significant):
+            prediction = RiskPrediction(
+                latitude=float(lat),
+                longitude=float(lng),
+                risk_level=risk_level,
+                risk_category=self.categorize_risk(risk_level),
+                confidence=0.8,  # Confiance simulée
+                factors=self.identify_risk_factors(lat, lng, factor_incidents[i] if factor_incidents else None)
+            )
+            predictions.append(prediction)
+        
+        return predictions
+    
+    def predict_risk_zones_within(self, region_bounds: Dict, resolution=None,
+                                  deadline_ms: Optional[float] = None) -> Tuple[List[RiskPrediction], Dict]:
+        """Prédire les zones à haut risque dans un temps borné (résolution atteinte en retour)"""
+        started = time.monotonic()
+        lat_min, lat_max = sorted((region_bounds['lat_min'], region_bounds['lat_max']))
+        lng_min, lng_max = sorted((region_bounds['lng_min'], region_bounds['lng_max']))
+        n_lat, n_lng = self.parse_grid_resolution(resolution)
+        bounds = self.prediction_cache.normalize_bounds(lat_min, lat_max, lng_min, lng_max)
+        cache_key = self.prediction_cache.make_key(bounds, (n_lat, n_lng))
+        complete = {'requested': [n_lat, n_lng], 'reached': [n_lat, n_lng], 'complete': True, 'levels': 1}
+        
+        # Résultat complet déjà en cache, ou aucune échéance : calcul habituel
+        cached = self.prediction_cache.get(cache_key)
+        if cached is not None:
+            return [RiskPrediction(**prediction) for prediction in cached], complete
+        if deadline_ms is None:
+            return self.predict_risk_zones(region_bounds, (n_lat, n_lng)), complete
+        
+        # Résultat partagé entre requêtes identiques ; mis en cache (même clé que
+        # predict_risk_zones) seulement s'il atteint la résolution demandée
+        deadline = started + deadline_ms / 1000
         
-        if not nearby_incidents:
-            return 0.1  # Risque minimal
+        def compute() -> Tuple[List[RiskPrediction], Dict]:
+            failures = self.nearby_failures()
+            predictions, reached = self.refine_risk_zones(bounds, n_lat, n_lng, deadline)
+            if reached['complete']:
+                self.cache_risk_zones(cache_key, bounds, predictions, failures)
+            return predictions, reached
         
-        # Facteurs de risque
-        incident_count = len(nearby_incidents)
-        avg_severity = np.mean([inc['severity'] for inc in nearby_incidents])
-        recent_incidents = len([inc for inc in nearby_incidents 
-                              if (datetime.now() - inc['timestamp']).days < 30])
+        return self.flights['predict-risk-zones'].do(f"{cache_key}:{deadline_ms:g}ms", compute)
+    
+    @timed('refine_risk_zones')
+    def refine_risk_zones(self, bounds: Tuple[float, float, float, float], n_lat: int, n_lng: int,
+                          deadline: float) -> Tuple[List[RiskPrediction], Dict]:
+        """Calculer les zones à risque par raffinement progressif jusqu'à l'échéance (time.monotonic)
+        
+        Une grille grossière (pas de 2^k points de la grille demandée) est évaluée en premier ;
+        chaque niveau suivant divise le pas par deux dans les seules cellules dont un coin dépasse
+        le seuil de risque (subdivision de type quadtree). Un niveau n'est lancé que si sa durée,
+        estimée d'après les niveaux précédents, tient avant l'échéance. Les
+        cellules sous le seuil ne sont pas raffinées : un foyer plus petit que le pas grossier
+        peut ne pas apparaître.
+        """
+        lat_min, lat_max, lng_min, lng_max = bounds
+        lat_points = np.linspace(lat_min, lat_max, n_lat)
+        lng_points = np.linspace(lng_min, lng_max, n_lng)
+        risk_levels = np.full((n_lat, n_lng), np.nan)
+        
+        if self.nearby_backend == 'memory' and self.spatial_index.ready:
+            # Grille rectiligne couvrant les points demandés (une passe vectorisée)
+            dominant = np.full((n_lat, n_lng), -1)
+            densities = np.zeros((n_lat, n_lng))
+            
+            def cost(rows: np.ndarray, cols: np.ndarray, wanted: np.ndarray) -> int:
+                return int(wanted.any(axis=1).sum() * wanted.any(axis=0).sum())
+            
+            def evaluate(rows: np.ndarray, cols: np.ndarray, wanted: np.ndarray):
+                rows, cols = rows[wanted.any(axis=1)], cols[wanted.any(axis=0)]
+                if len(rows) and len(cols):
+                    result = self.evaluate_risk_grid(lat_points[rows], lng_points[cols])
+                    cells = np.ix_(rows, cols)
+                    risk_levels[cells] = result['risk_levels']
+                    dominant[cells] = result['dominant_categories']
+                    densities[cells] = result['densities']
+            
+            def predictions() -> List[RiskPrediction]:
+                result = {'risk_levels': np.nan_to_num(risk_levels, nan=0.0), 'dominant_categories': dominant,
+                          'densities': densities}
+                return self.grid_risk_predictions(lat_points, lng_points, result)
+        else:
+            def cost(rows: np.ndarray, cols: np.ndarray, wanted: np.ndarray) -> int:
+                return int(wanted.sum())
+            
+            def evaluate(rows: np.ndarray, cols: np.ndarray, wanted: np.ndarray):
+                i, j = rows[np.nonzero(wanted)[0]], cols[np.nonzero(wanted)[1]]
+                if len(i):
+                    risk_levels[i, j] = self.point_risk_levels(list(zip(lat_points[i], lng_points[j])))
+            
+            def predictions() -> List[RiskPrediction]:
+                return self.point_risk_predictions([(lat_points[i], lng_points[j], float(risk_levels[i, j]))
+                                                    for i, j in zip(*np.nonzero(risk_levels > 0.3))])
+        
+        def lattice(n: int, step: int) -> np.ndarray:
+            indices = np.arange(0, n, step)
+            return indices if indices[-1] == n - 1 else np.append(indices, n - 1)
+        
+        ratio = (max(n_lat, n_lng) - 1) / (self.coarse_grid_resolution - 1)
+        step = 1 << int(np.ceil(np.log2(ratio))) if ratio > 1 else 1
+        rows, cols = lattice(n_lat, step), lattice(n_lng, step)
+        wanted = np.ones((len(rows), len(cols)), dtype=bool)
+        durations = []  # (points évalués, secondes) par niveau
+        significant = 0
+        
+        while True:
+            level_started = time.monotonic()
+            evaluated = cost(rows, cols, wanted)
+            evaluate(rows, cols, wanted)
+            durations.append((evaluated, time.monotonic() - level_started))
+            reached = step
+            significant, new_significant = int(np.sum(risk_levels > 0.3)), int(np.sum(risk_levels > 0.3)) - significant
+            
+            if len(durations) == 1:
+                # Prédictions de la grille grossière : résultat minimal et coût unitaire des facteurs
+                built_started = time.monotonic()
+                result = predictions()
+                prediction_cost = (time.monotonic() - built_started) / max(len(result), 1)
+            else:
+                result = None
+            if step == 1:
+                break
+            
+            # Cellules dont un coin dépasse le seuil (axe à un seul point : cellules dégénérées)
+            hot = risk_levels[np.ix_(rows, cols)] > 0.3
+            row_start, row_end = (rows[:-1], rows[1:]) if len(rows) > 1 else (rows, rows)
+            col_start, col_end = (cols[:-1], cols[1:]) if len(cols) > 1 else (cols, cols)
+            if len(rows) > 1:
+                hot = hot[:-1] | hot[1:]
+            if len(cols) > 1:
+                hot = hot[:, :-1] | hot[:, 1:]
+            
+            # Points couverts par ces cellules (tableau de différences 2D)
+            r, c = np.nonzero(hot)
+            cover = np.zeros((n_lat + 1, n_lng + 1), dtype=np.int32)
+            np.add.at(cover, (row_start[r], col_start[c]), 1)
+            np.add.at(cover, (row_start[r], col_end[c] + 1), -1)
+            np.add.at(cover, (row_end[r] + 1, col_start[c]), -1)
+            np.add.at(cover, (row_end[r] + 1, col_end[c] + 1), 1)
+            covered = cover.cumsum(axis=0).cumsum(axis=1)[:n_lat, :n_lng] > 0
+            
+            step //= 2
+            rows, cols = lattice(n_lat, step), lattice(n_lng, step)
+            wanted = (covered & np.isnan(risk_levels))[np.ix_(rows, cols)]
+            
+            # Durée estimée du niveau (affine en nombre de points d'après les deux derniers
+            # niveaux : le coût fixe de la grille grossière n'est pas extrapolé), plus la
+            # construction des prédictions (proportion de points significatifs du dernier niveau)
+            points = cost(rows, cols, wanted)
+            (points_before, seconds_before), (points_last, seconds_last) = durations[-2:] if len(durations) > 1 \
+                else ((0, 0.0), durations[-1])
+            slope = (seconds_last - seconds_before) / (points_last - points_before) \
+                if points_last > points_before else seconds_last / max(points_last, 1)
+            estimate = max(seconds_last + max(slope, 0.0) * (points - points_last), 0.0) if points else 0.0
+            estimate += prediction_cost * (significant + points * new_significant / max(evaluated, 1))
+            if time.monotonic() + estimate > deadline:
+                break
+        
+        return result if result is not None else predictions(), {
+            'requested': [n_lat, n_lng],
+            'reached': [len(lattice(n_lat, reached)), len(lattice(n_lng, reached))],
+            'complete': reached == 1,
+            'levels': len(durations)
+        }
+    
+    def parse_grid_resolution(self, resolution) -> Tuple[int, int]:
+        """Valider la résolution de grille demandée (entier ou [lignes, colonnes])"""
+        if resolution is None:
+            resolution = self.default_grid_resolution
+        if isinstance(resolution, (list, tuple)):
+            n_lat, n_lng = int(resolution[0]), int(resolution[1])
+        else:
+            n_lat = n_lng = int(resolution)
+        
+        if not (1 <= n_lat <= self.max_grid_resolution and 1 <= n_lng <= self.max_grid_resolution):
+            raise ValueError(f"Résolution de grille invalide (1 à {self.max_grid_resolution} points par axe)")
+        
+        return n_lat, n_lng
+    
+    def evaluate_risk_grid(self, lat_points: np.ndarray, lng_points: np.ndarray) -> Dict[str, np.ndarray]:
+        """Niveaux de risque, catégories dominantes et densités d'une grille (index spatial en mémoire)"""
+        incidents = self.spatial_index.columns_within(
+            lat_points[0], lat_points[-1], lng_points[0], lng_points[-1],
+            margin=max(self.risk_engine.risk_radius, self.risk_engine.factor_radius)
+        )
+        
+        grid_lats, grid_lngs = np.meshgrid(lat_points, lng_points, indexing='ij')
+        densities = self.get_population_densities(grid_lats, grid_lngs)
+        result = self.risk_engine.evaluate(lat_points, lng_points, incidents, densities)
+        result['densities'] = densities
+        return result
+    
+    def grid_risk_predictions(self, lat_points: np.ndarray, lng_points: np.ndarray,
+                              result: Dict[str, np.ndarray]) -> List[RiskPrediction]:
+        """Convertir les points significatifs d'une grille évaluée en prédictions"""
+        predictions = []
+        for i, j in zip(*np.nonzero(result['risk_levels'] > 0.3)):  # Seuil de risque significatif
+            risk_level = float(result['risk_levels'][i, j])
+            dominant = result['dominant_categories'][i, j]
+            predictions.append(RiskPrediction(
+                latitude=float(lat_points[i]),
+                longitude=float(lng_points[j]),
+                risk_level=risk_level,
+                risk_category=self.categorize_risk(risk_level),
+                confidence=0.8,  # Confiance simulée
+                factors=self.describe_risk_factors(
+                    lat_points[i], lng_points[j],
+                    CATEGORY_NAMES[dominant] if dominant >= 0 else None,
+                    result['densities'][i, j]
+                )
+            ))
+        
+        return predictions
+    
+    def predict_risk_grid(self, lat_points: np.ndarray, lng_points: np.ndarray) -> List[RiskPrediction]:
+        """Prédire les zones à risque de toute une grille en une passe vectorisée"""
+        return self.grid_risk_predictions(lat_points, lng_points, self.evaluate_risk_grid(lat_points, lng_points))
+    
+    @property
+    def aggregates_ready(self) -> bool:
+        """Risque point par point lu dans les agrégats (backend 'aggregates', agrégats construits)"""
+        return self.nearby_backend == 'aggregates' and self.risk_aggregates.ready
+    
+    def calculate_risk_level(self, lat: float, lng: float,
+                             nearby_incidents: Optional[List[Dict]] = None) -> float:
+        """Calculer le niveau de risque pour une coordonnée"""
+        if nearby_incidents is None and self.aggregates_ready:
+            # Agrégats des cellules situées dans un rayon de 5km
+            stats = self.risk_aggregates.query(lat, lng, 5000)
+            if stats['count'] == 0:
+                return 0.1  # Risque minimal
+            incident_count = stats['count']
+            avg_severity = stats['severity_sum'] / incident_count
+            recent_incidents = stats['recent_count']
+        else:
+            # Récupérer les incidents historiques dans un rayon de 5km
+            if nearby_incidents is None:
+                nearby_incidents = self.get_nearby_incidents(lat, lng, 5000)
+            
+            if not nearby_incidents:
+                return 0.1  # Risque minimal
+            
+            # Facteurs de risque
+            incident_count = len(nearby_incidents)
+            avg_severity = np.mean([inc['severity'] for inc in nearby_incidents])
+            recent_incidents = len([inc for inc in nearby_incidents 
+                                  if (datetime.now() - inc['timestamp']).days < 30])
         
         # Densité de population
         pop_density = self.get_population_density(lat, lng)
@@ -355,8 +3411,73 @@ class DisasterAIService:
         
         return min(risk_score, 1.0)
     
+    @timed('get_nearby_incidents')
     def get_nearby_incidents(self, lat: float, lng: float, radius: int) -> List[Dict]:
         """Récupérer les incidents à proximité d'une coordonnée"""
+        if self.nearby_backend == 'memory' and self.spatial_index.ready:
+            positions = self.spatial_index.query_radius(lat, lng, radius)
+            return self.spatial_index.records(positions)
+        
+        return self.query_nearby_incidents_mongo(lat, lng, radius)
+    
+    @timed('get_nearby_incidents_many')
+    def get_nearby_incidents_many(self, points: List[Tuple[float, float]], radius: int) -> List[List[Dict]]:
+        """Récupérer les incidents à proximité de plusieurs coordonnées (requêtes MongoDB concurrentes)"""
+        if (self.nearby_backend == 'memory' and self.spatial_index.ready) or len(points) <= 1:
+            return [self.get_nearby_incidents(lat, lng, radius) for lat, lng in points]
+        
+        self.metrics.count_mongo_queries(len(points))
+        executor = self.nearby_executor
+        futures = [executor.submit(self.find_nearby_incidents, lat, lng, radius) for lat, lng in points]
+        
+        # Délai global : au-delà, les requêtes en retard sont abandonnées
+        done, pending = wait(futures, timeout=2 * self.mongo_query_timeout_ms / 1000)
+        for future in pending:
+            future.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} requêtes de proximité abandonnées (délai dépassé)")
+            self.record_nearby_failures(len(pending), 'timeout')
+        
+        results = [future.result() if future in done else None for future in futures]
+        failed = sum(result is None for result in results) - len(pending)
+        if failed:
+            self.record_nearby_failures(failed, 'error')
+        return [result if result is not None else [] for result in results]
+    
+    def record_nearby_failures(self, count: int, reason: str):
+        """Compter des requêtes de proximité sans résultat (voisinage vide à tort)"""
+        self.metrics.increment('nearby_query_failures_total', count, reason=reason)
+        self._nearby_state.failures = self.nearby_failures() + count
+    
+    def nearby_failures(self) -> int:
+        """Requêtes de proximité échouées dans le thread courant (compteur croissant)
+        
+        Un calcul compare ce compteur avant et après lui-même pour savoir si son résultat
+        est incomplet (et ne doit pas être mis en cache).
+        """
+        return getattr(self._nearby_state, 'failures', 0)
+    
+    @property
+    def nearby_executor(self) -> ThreadPoolExecutor:
+        """Pool de threads des requêtes de proximité, créé au premier usage (par processus)"""
+        with self._nearby_executor_lock:
+            if self._nearby_executor is None:
+                self._nearby_executor = ThreadPoolExecutor(max_workers=self.nearby_concurrency,
+                                                           thread_name_prefix='nearby-query')
+            return self._nearby_executor
+    
+    def query_nearby_incidents_mongo(self, lat: float, lng: float, radius: int) -> List[Dict]:
+        """Récupérer les incidents à proximité via une requête $near MongoDB"""
+        self.metrics.count_mongo_queries()
+        incidents = self.find_nearby_incidents(lat, lng, radius)
+        if incidents is None:
+            self.record_nearby_failures(1, 'error')
+            return []
+        return incidents
+    
+    @timed('mongo_near_query')
+    def find_nearby_incidents(self, lat: float, lng: float, radius: int) -> Optional[List[Dict]]:
+        """Requête $near MongoDB (projection minimale, durée bornée côté serveur) ; None en cas d'échec"""
         try:
             # Requête géospatiale MongoDB
             query = {
@@ -371,24 +3492,23 @@ class DisasterAIService:
                 }
             }
             
-            incidents = []
-            cursor = self.db.incidents.find(query)
+            cursor = self.db.incidents.find(query, NEARBY_PROJECTION).max_time_ms(self.mongo_query_timeout_ms)
             
-            for doc in cursor:
-                incidents.append({
+            return [
+                {
                     'id': str(doc['_id']),
                     'latitude': doc['location']['coordinates'][1],
                     'longitude': doc['location']['coordinates'][0],
                     'category': doc['category'],
                     'severity': doc['severity'],
                     'timestamp': doc['createdAt']
-                })
-            
-            return incidents
+                }
+                for doc in cursor
+            ]
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des incidents proches: {e}")
-            return []
+            return None
     
     def categorize_risk(self, risk_level: float) -> str:
         """Catégoriser le niveau de risque"""
@@ -401,20 +3521,35 @@ class DisasterAIService:
         else:
             return 'low'
     
-    def identify_risk_factors(self, lat: float, lng: float) -> List[str]:
+    def identify_risk_factors(self, lat: float, lng: float,
+                              nearby_incidents: Optional[List[Dict]] = None) -> List[str]:
         """Identifier les facteurs de risque pour une zone"""
-        factors = []
+        most_common = None
+        if nearby_incidents is None and self.aggregates_ready:
+            # Histogramme des catégories des cellules situées dans un rayon de 10km
+            category_counts = self.risk_aggregates.query(lat, lng, 10000)['category_counts']
+            if category_counts.max() > 0:
+                most_common = CATEGORY_NAMES[int(category_counts.argmax())]
+        else:
+            # Analyser les incidents historiques
+            if nearby_incidents is None:
+                nearby_incidents = self.get_nearby_incidents(lat, lng, 10000)
+            
+            if nearby_incidents:
+                categories = [inc['category'] for inc in nearby_incidents]
+                most_common = max(set(categories), key=categories.count)
         
-        # Analyser les incidents historiques
-        nearby_incidents = self.get_nearby_incidents(lat, lng, 10000)
+        return self.describe_risk_factors(lat, lng, most_common, self.get_population_density(lat, lng))
+    
+    def describe_risk_factors(self, lat: float, lng: float, most_common: Optional[str],
+                              pop_density: float) -> List[str]:
+        """Décrire les facteurs de risque d'une zone à partir de ses indicateurs"""
+        factors = []
         
-        if nearby_incidents:
-            categories = [inc['category'] for inc in nearby_incidents]
-            most_common = max(set(categories), key=categories.count)
+        if most_common:
             factors.append(f"Historique de {most_common}")
         
         # Analyser la densité de population
-        pop_density = self.get_population_density(lat, lng)
         if pop_density > 1000:
             factors.append("Zone densément peuplée")
         
@@ -427,51 +3562,44 @@ class DisasterAIService:
         
         return factors
     
-    def perform_clustering(self, incidents: List[IncidentData]) -> List[Dict]:
+    @timed('perform_clustering')
+    def summarize_clusters(self, incidents: IncidentBatch, eps_meters: Optional[float] = None,
+                           min_samples: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Résumés des clusters géographiques (centres, rayons, effectifs, gravités, membres)"""
+        # DBSCAN haversine pour identifier les clusters géographiques
+        labels = self.clustering_engine.fit(incidents.latitudes, incidents.longitudes, eps_meters, min_samples)
+        summary = self.clustering_engine.summarize(labels, incidents.latitudes, incidents.longitudes,
+                                                   incidents.severities.astype(np.float64))
+        summary['labels'] = np.flatnonzero(summary['counts'] >= 2)
+        return summary
+    
+    def perform_clustering(self, incidents: IncidentBatch, eps_meters: Optional[float] = None,
+                           min_samples: Optional[int] = None) -> List[Dict]:
         """Effectuer un clustering des incidents pour identifier les zones à risque"""
         if len(incidents) < 3:
             return []
         
         try:
-            # Préparer les coordonnées pour le clustering
-            coordinates = np.array([[inc.latitude, inc.longitude] for inc in incidents])
+            if not isinstance(incidents, IncidentBatch):
+                incidents = IncidentBatch.from_incidents(incidents)
             
-            # DBSCAN pour identifier les clusters géographiques
-            dbscan = DBSCAN(eps=0.01, min_samples=2)  # ~1km de rayon
-            cluster_labels = dbscan.fit_predict(coordinates)
+            summary = self.summarize_clusters(incidents, eps_meters, min_samples)
             
             clusters = []
-            unique_labels = set(cluster_labels)
-            
-            for label in unique_labels:
-                if label == -1:  # Bruit (points isolés)
-                    continue
-                
-                # Incidents dans ce cluster
-                cluster_incidents = [incidents[i] for i, l in enumerate(cluster_labels) if l == label]
-                
-                if len(cluster_incidents) >= 2:
-                    # Calculer le centre du cluster
-                    center_lat = np.mean([inc.latitude for inc in cluster_incidents])
-                    center_lng = np.mean([inc.longitude for inc in cluster_incidents])
-                    
-                    # Calculer le rayon du cluster
-                    distances = [np.sqrt((inc.latitude - center_lat)**2 + (inc.longitude - center_lng)**2) 
-                               for inc in cluster_incidents]
-                    radius = max(distances) * 111000  # Conversion en mètres
-                    
-                    # Analyser la gravité du cluster
-                    avg_severity = np.mean([inc.severity for inc in cluster_incidents])
-                    
-                    clusters.append({
-                        'id': f"cluster_{label}",
-                        'center': {'latitude': center_lat, 'longitude': center_lng},
-                        'radius': radius,
-                        'incident_count': len(cluster_incidents),
-                        'average_severity': avg_severity,
-                        'risk_level': self.categorize_risk(avg_severity / 5.0),
-                        'incidents': [inc.id for inc in cluster_incidents]
-                    })
+            for label in summary['labels']:
+                avg_severity = float(summary['average_severities'][label])
+                clusters.append({
+                    'id': f"cluster_{label}",
+                    'center': {
+                        'latitude': float(summary['center_latitudes'][label]),
+                        'longitude': float(summary['center_longitudes'][label])
+                    },
+                    'radius': float(summary['radii'][label]),
+                    'incident_count': int(summary['counts'][label]),
+                    'average_severity': avg_severity,
+                    'risk_level': self.categorize_risk(avg_severity / 5.0),
+                    'incidents': incidents.ids[summary['positions'][label]].tolist()
+                })
             
             return clusters
             
@@ -479,31 +3607,117 @@ class DisasterAIService:
             logger.error(f"Erreur lors du clustering: {e}")
             return []
     
+    def anomaly_columns(self, incidents: IncidentBatch, result: Dict) -> Dict:
+        """Anomalies au format binaire colonnaire"""
+        positions = result['positions']
+        return {
+            'incident_id': incidents.ids[positions].tolist(),
+            'latitude': column_to_wire(incidents.latitudes[positions], np.float64),
+            'longitude': column_to_wire(incidents.longitudes[positions], np.float64),
+            'category': column_to_wire(incidents.categories[positions], np.int8),
+            'severity': column_to_wire(incidents.severities[positions], np.int8),
+            'anomaly_score': column_to_wire(result['scores'], np.float64),
+            'timestamp': column_to_wire(incidents.timestamps[positions].astype(np.int64), np.int64),
+            'reasons': result['reasons']
+        }
+    
+    def cluster_columns(self, incidents: IncidentBatch, summary: Optional[Dict]) -> Dict:
+        """Clusters au format binaire colonnaire (membres à plat, avec décalages)"""
+        if summary is None:
+            labels = np.empty(0, dtype=np.int64)
+            members = []
+        else:
+            labels = summary['labels']
+            members = [summary['positions'][label] for label in labels]
+        
+        def column(name: str) -> np.ndarray:
+            return summary[name][labels] if summary is not None else np.empty(0)
+        
+        sizes = np.array([len(positions) for positions in members], dtype=np.int64)
+        member_positions = np.concatenate(members) if members else np.empty(0, dtype=np.int64)
+        average_severities = column('average_severities')
+        return {
+            'id': column_to_wire(labels, np.int64),
+            'center_latitude': column_to_wire(column('center_latitudes'), np.float64),
+            'center_longitude': column_to_wire(column('center_longitudes'), np.float64),
+            'radius': column_to_wire(column('radii'), np.float64),
+            'incident_count': column_to_wire(sizes, np.int64),
+            'average_severity': column_to_wire(average_severities, np.float64),
+            'risk_level': [self.categorize_risk(severity / 5.0) for severity in average_severities],
+            'incident_offsets': column_to_wire(np.concatenate([[0], np.cumsum(sizes)]), np.int64),
+            'incident_ids': incidents.ids[member_positions].tolist()
+        }
+    
+    def read_bulk_request(self) -> Tuple[Dict, IncidentBatch]:
+        """Lire une requête de masse (JSON ou MessagePack colonnaire) et son lot d'incidents"""
+        if request.mimetype in MSGPACK_MIMETYPES:
+            import msgpack
+            data = msgpack.unpackb(request.get_data(), raw=False)
+            return data, IncidentBatch.from_columns(data.get('incidents') or {})
+        data = request.get_json()
+        return data, IncidentBatch.from_records(data.get('incidents', []))
+    
+    def binary_response_requested(self) -> bool:
+        """Négocier le format de réponse (par défaut, celui de la requête)"""
+        offered = ['application/json', MSGPACK_MIMETYPES[0]]
+        if request.mimetype in MSGPACK_MIMETYPES:
+            offered.reverse()
+        best = request.accept_mimetypes.best_match(offered + [MSGPACK_MIMETYPES[1]], default=offered[0])
+        return best in MSGPACK_MIMETYPES
+    
+    def binary_response(self, payload: Dict, status: int = 200) -> Response:
+        import msgpack
+        return Response(msgpack.packb(payload, use_bin_type=True), status=status, mimetype=MSGPACK_MIMETYPES[0])
+    
     def setup_routes(self):
         """Configurer les routes Flask"""
         
+        if self.metrics.enabled:
+            @self.app.before_request
+            def start_request_metrics():
+                g.metrics_started = time.perf_counter()
+                g.mongo_queries = 0
+            
+            @self.app.after_request
+            def record_request_metrics(response):
+                if 'metrics_started' in g:
+                    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+                    self.metrics.observe('request_seconds', time.perf_counter() - g.metrics_started,
+                                         endpoint=endpoint)
+                    self.metrics.observe('request_mongo_queries', g.mongo_queries, endpoint=endpoint)
+                return response
+        
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            if not self.metrics.enabled:
+                return jsonify({'error': 'Métriques désactivées (METRICS_ENABLED)'}), 404
+            return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+        
         @self.app.route('/health', methods=['GET'])
         def health_check():
-            return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+            return jsonify({
+                'status': 'healthy',
+                'timestamp': datetime.now().isoformat(),
+                'model_version': self.models.version if self.models else None,
+                'startup': self.startup_metrics
+            })
         
         @self.app.route('/detect-anomalies', methods=['POST'])
         def detect_anomalies_endpoint():
             try:
-                data = request.get_json()
-                incidents_data = data.get('incidents', [])
+                # Convertir en lot colonnaire (JSON par incident ou MessagePack par colonne)
+                try:
+                    _, incidents = self.read_bulk_request()
+                except (KeyError, TypeError, ValueError) as e:
+                    return jsonify({'error': f"Lot d'incidents invalide: {e}"}), 400
+                self.metrics.observe('batch_size', len(incidents), endpoint='detect-anomalies')
                 
-                # Convertir en objets IncidentData
-                incidents = []
-                for inc_data in incidents_data:
-                    incident = IncidentData(
-                        id=inc_data['id'],
-                        latitude=inc_data['latitude'],
-                        longitude=inc_data['longitude'],
-                        category=inc_data['category'],
-                        severity=inc_data['severity'],
-                        timestamp=datetime.fromisoformat(inc_data['timestamp'])
-                    )
-                    incidents.append(incident)
+                if self.binary_response_requested():
+                    result = self.score_anomalies(incidents)
+                    return self.binary_response({
+                        'anomalies': self.anomaly_columns(incidents, result),
+                        'categories': CATEGORY_NAMES.tolist()
+                    })
                 
                 anomalies = self.detect_anomalies(incidents)
                 return jsonify({'anomalies': anomalies})
@@ -512,13 +3726,90 @@ class DisasterAIService:
                 logger.error(f"Erreur dans detect-anomalies: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/detect-anomalies/stream', methods=['POST'])
+        def detect_anomalies_stream_endpoint():
+            # Un incident JSON par ligne en entrée, une anomalie JSON par ligne en sortie
+            batch_size = min(max(request.args.get('batch_size', self.stream_batch_size, type=int), 1), 10000)
+            models = self.models  # Mêmes modèles pour tout le flux
+            
+            def score(records: List[Dict]):
+                self.metrics.observe('batch_size', len(records), endpoint='detect-anomalies/stream')
+                for anomaly in self.detect_anomalies(IncidentBatch.from_records(records), models):
+                    yield json.dumps(anomaly) + '\n'
+            
+            def generate():
+                records = []
+                scored = 0
+                errors = 0
+                for line_number, line in enumerate(request.stream, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        errors += 1
+                        yield json.dumps({'error': f"JSON invalide: {e}", 'line': line_number}) + '\n'
+                        continue
+                    
+                    # Incident incomplet ou mal formé : signalé et ignoré, le flux continue
+                    try:
+                        records.append(validate_incident_record(record))
+                    except ValueError as e:
+                        errors += 1
+                        yield json.dumps({'error': f"Incident invalide: {e}", 'line': line_number}) + '\n'
+                        continue
+                    
+                    if len(records) >= batch_size:
+                        yield from score(records)
+                        scored += len(records)
+                        records = []
+                
+                if records:
+                    yield from score(records)
+                    scored += len(records)
+                
+                yield json.dumps({'summary': {'scored': scored, 'errors': errors,
+                                              'model_version': models.version if models else None}}) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        @self.app.route('/risk-tiles', methods=['GET'])
+        def risk_tiles_metadata():
+            return jsonify(self.tile_pyramid.describe())
+        
+        @self.app.route('/risk-tiles/<int:zoom>/<int:x>/<int:y>', methods=['GET'])
+        def risk_tile(zoom, x, y):
+            data = self.tile_pyramid.read(zoom, x, y)
+            if data is None:
+                return jsonify({'error': 'Tuile inconnue ou non générée'}), 404
+            
+            response = Response(data, mimetype='application/octet-stream')
+            response.set_etag(hashlib.blake2b(data, digest_size=12).hexdigest())
+            response.headers['Cache-Control'] = 'no-cache'  # Revalidation par ETag (tuiles régénérées)
+            response.headers['X-Tile-Cells'] = str(self.tile_pyramid.cells)
+            return response.make_conditional(request)
+        
         @self.app.route('/predict-risk-zones', methods=['POST'])
         def predict_risk_zones_endpoint():
             try:
                 data = request.get_json()
                 region_bounds = data.get('region_bounds')
                 
-                predictions = self.predict_risk_zones(region_bounds)
+                try:
+                    resolution = self.parse_grid_resolution(data.get('resolution'))
+                    deadline_ms = data.get('deadline_ms', self.default_deadline_ms)
+                    deadline_ms = float(deadline_ms) if deadline_ms is not None else None
+                    if deadline_ms is not None and not 0 < deadline_ms <= 60000:
+                        raise ValueError("Échéance invalide (deadline_ms entre 0 et 60000)")
+                except (TypeError, ValueError) as e:
+                    return jsonify({'error': str(e)}), 400
+                
+                # Avec échéance : meilleur résultat disponible et résolution atteinte
+                if deadline_ms is not None:
+                    predictions, grid = self.predict_risk_zones_within(region_bounds, resolution, deadline_ms)
+                else:
+                    predictions, grid = self.predict_risk_zones(region_bounds, resolution), None
                 
                 # Convertir en format JSON
                 result = []
@@ -532,6 +3823,8 @@ class DisasterAIService:
                         'factors': pred.factors
                     })
                 
+                if grid is not None:
+                    return jsonify({'predictions': result, 'resolution': grid})
                 return jsonify({'predictions': result})
                 
             except Exception as e:
@@ -541,23 +3834,37 @@ class DisasterAIService:
         @self.app.route('/cluster-incidents', methods=['POST'])
         def cluster_incidents_endpoint():
             try:
-                data = request.get_json()
-                incidents_data = data.get('incidents', [])
+                try:
+                    data, incidents = self.read_bulk_request()
+                except (KeyError, TypeError, ValueError) as e:
+                    return jsonify({'error': f"Lot d'incidents invalide: {e}"}), 400
+                
+                try:
+                    eps_meters = data.get('eps_meters')
+                    min_samples = data.get('min_samples')
+                    eps_meters = float(eps_meters) if eps_meters is not None else None
+                    min_samples = int(min_samples) if min_samples is not None else None
+                    if (eps_meters is not None and not 0 < eps_meters <= 100000) or \
+                            (min_samples is not None and min_samples < 1):
+                        raise ValueError("Paramètres de clustering invalides (eps_meters 0-100000, min_samples >= 1)")
+                except (TypeError, ValueError) as e:
+                    return jsonify({'error': str(e)}), 400
                 
-                # Convertir en objets IncidentData
-                incidents = []
-                for inc_data in incidents_data:
-                    incident = IncidentData(
-                        id=inc_data['id'],
-                        latitude=inc_data['latitude'],
-                        longitude=inc_data['longitude'],
-                        category=inc_data['category'],
-                        severity=inc_data['severity'],
-                        timestamp=datetime.fromisoformat(inc_data['timestamp'])
-                    )
-                    incidents.append(incident)
+                self.metrics.observe('batch_size', len(incidents), endpoint='cluster-incidents')
                 
-                clusters = self.perform_clustering(incidents)
+                # Lots identiques envoyés simultanément : un seul clustering
+                binary = self.binary_response_requested()
+                flight_key = f"{incidents.digest()}:{eps_meters}:{min_samples}:{'msgpack' if binary else 'json'}"
+                
+                if binary:
+                    def compute() -> Dict:
+                        summary = self.summarize_clusters(incidents, eps_meters, min_samples) if len(incidents) >= 3 else None
+                        return {'clusters': self.cluster_columns(incidents, summary)}
+                    
+                    return self.binary_response(self.flights['cluster-incidents'].do(flight_key, compute))
+                
+                clusters = self.flights['cluster-incidents'].do(
+                    flight_key, lambda: self.perform_clustering(incidents, eps_meters, min_samples))
                 return jsonify({'clusters': clusters})
                 
             except Exception as e:
@@ -567,36 +3874,131 @@ class DisasterAIService:
         @self.app.route('/retrain-models', methods=['POST'])
         def retrain_models_endpoint():
             try:
-                self.train_models()
-                return jsonify({'message': 'Modèles réentraînés avec succès'})
+                data = request.get_json(silent=True) or {}
+                kind = data.get('mode', 'full')
+                if kind not in ('full', 'incremental'):
+                    return jsonify({'error': "Mode d'entraînement invalide (full ou incremental)"}), 400
+                
+                job = self.submit_training(kind)
+                job['status_url'] = f"/retrain-models/{job['job_id']}"
+                return jsonify(job), 202
                 
             except Exception as e:
                 logger.error(f"Erreur lors du réentraînement: {e}")
                 return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/retrain-models/<job_id>', methods=['GET'])
+        def retrain_status_endpoint(job_id):
+            job = self.training_jobs.describe(job_id)
+            if job is None:
+                return jsonify({'error': 'Tâche inconnue'}), 404
+            return jsonify(job)
+        
+        @self.app.route('/incident-consumer', methods=['GET'])
+        def incident_consumer_endpoint():
+            # Statistiques locales si ce worker consomme, sinon celles publiées dans Redis
+            if self.incident_consumer.running:
+                return jsonify(self.incident_consumer.describe())
+            stats = self.incident_consumer.load_stats()
+            if stats is None:
+                return jsonify({'running': False, 'enabled': self.consumer_enabled}), 404
+            return jsonify(stats)
     
     def start_background_tasks(self):
         """Démarrer les tâches en arrière-plan"""
         def periodic_retraining():
             while True:
                 try:
-                    # Réentraîner les modèles toutes les 24 heures
-                    time.sleep(24 * 3600)
-                    logger.info("Réentraînement périodique des modèles")
-                    self.train_models()
+                    if self.training_mode == 'incremental':
+                        # Mise à jour incrémentale à intervalle court
+                        time.sleep(self.incremental_interval)
+                        job = self.submit_training('incremental')
+                    else:
+                        # Réentraîner les modèles toutes les 24 heures
+                        time.sleep(24 * 3600)
+                        logger.info("Réentraînement périodique des modèles")
+                        job = self.submit_training('full')
+                    self.training_jobs.wait(job['job_id'])
                 except Exception as e:
                     logger.error(f"Erreur lors du réentraînement périodique: {e}")
         
-        # Démarrer le thread de réentraînement
-        retraining_thread = threading.Thread(target=periodic_retraining, daemon=True)
-        retraining_thread.start()
+        def watch_models():
+            retraining_started = False
+            while True:
+                try:
+                    # Élection du processus entraîneur (reprise si l'élu disparaît)
+                    if not retraining_started and self.acquire_trainer_role():
+                        logger.info(f"Processus {os.getpid()} chargé de l'entraînement des modèles")
+                        if self.fast_start:
+                            kind = 'incremental' if self.models is not None and self.models.watermark else 'full'
+                            self.submit_training(kind)
+                        threading.Thread(target=periodic_retraining, daemon=True).start()
+                        if self.tiles_enabled:
+                            threading.Thread(target=periodic_tile_refresh, daemon=True).start()
+                        retraining_started = True
+                    
+                    # Élection du consommateur des événements Redis
+                    if (self.consumer_enabled and not self.incident_consumer.running
+                            and self.acquire_consumer_role()):
+                        self.incident_consumer.start()
+                    
+                    # Charger les versions publiées par le processus entraîneur
+                    version = current_model_version(self.models_dir)
+                    if version is not None:
+                        self.load_published_models(version)
+                except Exception as e:
+                    logger.error(f"Erreur lors du suivi des versions de modèles: {e}")
+                time.sleep(self.model_poll_interval)
+        
+        def periodic_tile_refresh():
+            while True:
+                try:
+                    # Tuiles touchées par les nouveaux incidents (toutes au premier passage)
+                    self.refresh_risk_tiles()
+                except Exception as e:
+                    logger.error(f"Erreur lors de la génération des tuiles de risque: {e}")
+                time.sleep(self.tile_refresh_interval if self.spatial_index.ready else self.model_poll_interval)
+        
+        def periodic_index_refresh():
+            while True:
+                try:
+                    # Intégrer les nouveaux incidents à l'index spatial et aux agrégats ;
+                    # reconstruction complète sur chaque worker quand elle est due
+                    time.sleep(self.index_refresh_interval)
+                    self.refresh_spatial_index(rebuild=self.spatial_index_stale())
+                except Exception as e:
+                    logger.error(f"Erreur lors du rafraîchissement de l'index spatial: {e}")
+        
+        # Démarrer le thread de suivi des modèles (et de réentraînement si élu)
+        models_thread = threading.Thread(target=watch_models, daemon=True)
+        models_thread.start()
+        
+        # Démarrer le thread de rafraîchissement de l'index spatial et des agrégats
+        # (l'index alimente aussi les modes 'mongo' et 'aggregates')
+        index_thread = threading.Thread(target=periodic_index_refresh, daemon=True)
+        index_thread.start()
     
     def run(self, host='0.0.0.0', port=3007, debug=False):
-        """Démarrer le service Flask"""
+        """Démarrer le service Flask (développement ; en production : gunicorn -c gunicorn.conf.py)"""
         logger.info(f"Démarrage du service IA sur {host}:{port}")
         self.app.run(host=host, port=port, debug=debug)
 
+def create_app() -> Flask:
+    """Fabrique d'application pour un serveur pré-fork (gunicorn --preload)
+    
+    Les modèles, le raster de densité et l'index spatial sont chargés une fois dans le
+    processus maître et partagés par les workers ; les connexions et les tâches de fond
+    sont créées dans chaque worker par after_fork (voir gunicorn.conf.py).
+    """
+    service = DisasterAIService(start_background=False)
+    service.warm_up()
+    return service.app
+
 if __name__ == '__main__':
     # Créer et démarrer le service
     ai_service = DisasterAIService()
-    ai_service.run()
+    if 'consume' in sys.argv[1:]:
+        ai_service.consume_incidents()
+    else:
+        ai_service.run()
 
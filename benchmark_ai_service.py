@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai reproductible du service IA
+Incidents synthétiques autour des villes algériennes, MongoDB et Redis simulés en mémoire
+
+Exemple :
+    python benchmark_ai_service.py --sizes 1000,10000,100000 --output benchmark.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import queue
+import threading
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import resource
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import ai_service
+from ai_service import (
+    ALGERIA_BOUNDS, MAJOR_CITIES, DisasterAIService, IncidentBatch, haversine_distances
+)
+
+logger = logging.getLogger('benchmark')
+
+# Répartition des catégories (part des signalements)
+CATEGORY_WEIGHTS = {
+    'accident': 0.30, 'infrastructure': 0.15, 'fire': 0.14, 'flood': 0.10, 'health': 0.09,
+    'security': 0.07, 'storm': 0.06, 'other': 0.05, 'earthquake': 0.02, 'landslide': 0.02
+}
+
+# Saisonnalité par catégorie (poids mensuels, janvier à décembre)
+SEASONALITY = {
+    'fire': [0.2, 0.2, 0.3, 0.4, 0.6, 1.0, 1.0, 1.0, 0.8, 0.4, 0.2, 0.2],
+    'flood': [0.8, 0.7, 0.6, 0.4, 0.2, 0.1, 0.1, 0.1, 0.4, 1.0, 1.0, 0.9],
+    'storm': [1.0, 0.9, 0.7, 0.5, 0.3, 0.2, 0.2, 0.2, 0.4, 0.7, 0.9, 1.0],
+    'landslide': [1.0, 0.9, 0.7, 0.4, 0.2, 0.1, 0.1, 0.1, 0.3, 0.6, 0.9, 1.0]
+}
+
+# Activité selon l'heure de la journée (pics aux heures de pointe)
+DIURNAL_WEIGHTS = np.array([
+    0.3, 0.2, 0.2, 0.2, 0.3, 0.5, 0.9, 1.4, 1.6, 1.3, 1.1, 1.1,
+    1.2, 1.2, 1.1, 1.1, 1.3, 1.6, 1.7, 1.4, 1.0, 0.8, 0.6, 0.4
+])
+
+SEVERITY_WEIGHTS = np.array([0.35, 0.30, 0.20, 0.10, 0.05])
+
+def generate_incidents(n: int, seed: int = 42, end: Optional[datetime] = None,
+                       days: int = 365) -> Dict[str, np.ndarray]:
+    """Générer n incidents synthétiques (colonnes) de façon déterministe"""
+    rng = np.random.default_rng(seed)
+    end = end or datetime(2024, 12, 31)
+    
+    # Coordonnées : agglomérations pondérées par leur densité, zones rurales du Tell, Sahara
+    city_weights = MAJOR_CITIES[:, 2] / MAJOR_CITIES[:, 2].sum()
+    cities = rng.choice(len(MAJOR_CITIES), n, p=city_weights)
+    zone = rng.random(n)
+    lats = MAJOR_CITIES[cities, 0] + rng.normal(0, 0.08, n)
+    lngs = MAJOR_CITIES[cities, 1] + rng.normal(0, 0.08, n)
+    
+    rural = (zone >= 0.85) & (zone < 0.95)
+    lats[rural] = rng.uniform(32.0, 37.0, rural.sum())
+    lngs[rural] = rng.uniform(-2.0, 8.6, rural.sum())
+    sahara = zone >= 0.95
+    lats[sahara] = rng.uniform(ALGERIA_BOUNDS['lat_min'], 32.0, sahara.sum())
+    lngs[sahara] = rng.uniform(ALGERIA_BOUNDS['lng_min'], ALGERIA_BOUNDS['lng_max'], sahara.sum())
+    lats = np.clip(lats, ALGERIA_BOUNDS['lat_min'], ALGERIA_BOUNDS['lat_max'])
+    lngs = np.clip(lngs, ALGERIA_BOUNDS['lng_min'], ALGERIA_BOUNDS['lng_max'])
+    
+    # Catégories
+    names = list(CATEGORY_WEIGHTS)
+    category_index = rng.choice(len(names), n, p=list(CATEGORY_WEIGHTS.values()))
+    categories = np.array(names, dtype=object)[category_index]
+    
+    # Dates : jour tiré selon la saisonnalité de la catégorie, heure selon l'activité journalière
+    start = np.datetime64(end - timedelta(days=days), 'D')
+    day_offsets = rng.integers(0, days, n)
+    for name, weights in SEASONALITY.items():
+        pending = np.flatnonzero(category_index == names.index(name))
+        while len(pending):
+            candidates = rng.integers(0, days, len(pending))
+            months = (start + candidates).astype('datetime64[M]').astype(int) % 12
+            accepted = rng.random(len(pending)) < np.asarray(weights)[months]
+            day_offsets[pending[accepted]] = candidates[accepted]
+            pending = pending[~accepted]
+    hours = rng.choice(24, n, p=DIURNAL_WEIGHTS / DIURNAL_WEIGHTS.sum())
+    seconds = rng.integers(0, 3600, n)
+    timestamps = (start + day_offsets).astype('datetime64[ms]') + \
+        (hours * 3600 + seconds).astype('timedelta64[s]')
+    
+    # Gravité : plus élevée pour les catastrophes naturelles majeures
+    severities = rng.choice(5, n, p=SEVERITY_WEIGHTS) + 1
+    major = np.isin(categories, ['earthquake', 'flood', 'landslide']) & (rng.random(n) < 0.4)
+    severities = np.minimum(severities + major, 5).astype(np.int8)
+    
+    # Météo (renseignée pour une partie des signalements)
+    day_of_year = (timestamps.astype('datetime64[D]') - timestamps.astype('datetime64[Y]')).astype(int)
+    temperatures = (18 + 10 * np.sin(2 * np.pi * (day_of_year - 105) / 365)
+                    + (37 - lats) * 0.6 + rng.normal(0, 3, n))
+    humidities = np.clip(75 - (37 - lats) * 5 + rng.normal(0, 10, n), 5, 100)
+    wind_speeds = rng.gamma(2.0, 6.0, n) + np.where(categories == 'storm', 30.0, 0.0)
+    without_weather = rng.random(n) >= 0.6
+    for column in (temperatures, humidities, wind_speeds):
+        column[without_weather] = np.nan
+    
+    return {
+        'latitudes': lats,
+        'longitudes': lngs,
+        'categories': categories,
+        'severities': severities,
+        'timestamps': timestamps,
+        'temperatures': temperatures,
+        'humidities': humidities,
+        'wind_speeds': wind_speeds
+    }
+
+def incidents_to_records(incidents: Dict[str, np.ndarray], positions) -> List[Dict]:
+    """Convertir des incidents synthétiques au format JSON de l'API"""
+    records = []
+    for i in np.arange(len(incidents['latitudes']))[positions]:
+        record = {
+            'id': f"bench-{i}",
+            'latitude': float(incidents['latitudes'][i]),
+            'longitude': float(incidents['longitudes'][i]),
+            'category': incidents['categories'][i],
+            'severity': int(incidents['severities'][i]),
+            'timestamp': incidents['timestamps'][i].item().isoformat()
+        }
+        records.append(record)
+    return records
+
+def incidents_to_events(incidents: Dict[str, np.ndarray], positions) -> List[str]:
+    """Événements 'incident.created' publiés sur Redis (document MongoDB sérialisé)"""
+    events = []
+    for record in incidents_to_records(incidents, positions):
+        events.append(json.dumps({
+            'incident': {
+                '_id': record['id'],
+                'location': {'type': 'Point', 'coordinates': [record['longitude'], record['latitude']]},
+                'category': record['category'],
+                'severity': record['severity'],
+                'createdAt': record['timestamp']
+            },
+            'userId': 'benchmark'
+        }))
+    return events
+
+class InMemoryCursor:
+    """Curseur minimal (itération, batch_size, limit, max_time_ms)"""
+    
+    def __init__(self, collection: 'InMemoryCollection', positions: np.ndarray):
+        self.collection = collection
+        self.positions = positions
+    
+    def batch_size(self, size: int) -> 'InMemoryCursor':
+        return self
+    
+    def max_time_ms(self, milliseconds: int) -> 'InMemoryCursor':
+        return self
+    
+    def limit(self, count: int) -> 'InMemoryCursor':
+        if count:
+            self.positions = self.positions[:count]
+        return self
+    
+    def __iter__(self):
+        for position in self.positions:
+            yield self.collection.document(position)
+
+class InMemoryCollection:
+    """Collection d'incidents en mémoire, stockée en colonnes
+    
+    Prend en charge les requêtes émises par le service : filtre sur createdAt
+    ($gt, $gte, $lt, $lte) et recherche géospatiale $near.
+    """
+    
+    COLUMN_DTYPES = {
+        'latitudes': np.float64, 'longitudes': np.float64, 'categories': object, 'severities': np.int8,
+        'timestamps': 'datetime64[ms]', 'temperatures': np.float64, 'humidities': np.float64,
+        'wind_speeds': np.float64
+    }
+    
+    def __init__(self):
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMN_DTYPES.items()}
+    
+    def insert_columns(self, columns: Dict[str, np.ndarray]):
+        self.columns = {name: np.concatenate([self.columns[name], columns[name]]) for name in self.columns}
+    
+    def insert_many(self, documents: List[Dict]):
+        weather = [(doc.get('metadata') or {}).get('weather') or {} for doc in documents]
+        self.insert_columns({
+            'latitudes': np.array([doc['location']['coordinates'][1] for doc in documents], dtype=np.float64),
+            'longitudes': np.array([doc['location']['coordinates'][0] for doc in documents], dtype=np.float64),
+            'categories': np.array([doc['category'] for doc in documents], dtype=object),
+            'severities': np.array([doc['severity'] for doc in documents], dtype=np.int8),
+            'timestamps': np.array([np.datetime64(doc['createdAt'], 'ms') for doc in documents],
+                                   dtype='datetime64[ms]'),
+            'temperatures': np.array([w.get('temperature', np.nan) for w in weather], dtype=np.float64),
+            'humidities': np.array([w.get('humidity', np.nan) for w in weather], dtype=np.float64),
+            'wind_speeds': np.array([w.get('windSpeed', np.nan) for w in weather], dtype=np.float64)
+        })
+    
+    def insert_one(self, document: Dict):
+        self.insert_many([document])
+    
+    def document(self, position: int) -> Dict:
+        columns = self.columns
+        doc = {
+            '_id': f"bench-{position}",
+            'location': {'type': 'Point',
+                         'coordinates': [float(columns['longitudes'][position]),
+                                         float(columns['latitudes'][position])]},
+            'category': columns['categories'][position],
+            'severity': int(columns['severities'][position]),
+            'createdAt': columns['timestamps'][position].item(),
+            'metadata': {}
+        }
+        if not np.isnan(columns['temperatures'][position]):
+            doc['metadata']['weather'] = {
+                'temperature': float(columns['temperatures'][position]),
+                'humidity': float(columns['humidities'][position]),
+                'windSpeed': float(columns['wind_speeds'][position])
+            }
+        return doc
+    
+    def match(self, query: Optional[Dict]) -> np.ndarray:
+        positions = np.arange(len(self.columns['latitudes']))
+        for field, condition in (query or {}).items():
+            if field == 'createdAt':
+                timestamps = self.columns['timestamps'][positions]
+                for operator, value in condition.items():
+                    value = np.datetime64(value, 'ms')
+                    keep = {'$gt': timestamps > value, '$gte': timestamps >= value,
+                            '$lt': timestamps < value, '$lte': timestamps <= value}[operator]
+                    positions, timestamps = positions[keep], timestamps[keep]
+            elif field == 'location' and '$near' in condition:
+                near = condition['$near']
+                lng, lat = near['$geometry']['coordinates']
+                distances = haversine_distances(lat, lng, self.columns['latitudes'][positions],
+                                                self.columns['longitudes'][positions])
+                within = distances <= near.get('$maxDistance', np.inf)
+                positions = positions[within][np.argsort(distances[within], kind='stable')]
+            else:
+                raise NotImplementedError(f"Requête non prise en charge: {field}")
+        return positions
+    
+    def count_documents(self, query: Dict) -> int:
+        return len(self.match(query))
+    
+    def estimated_document_count(self) -> int:
+        return len(self.columns['latitudes'])
+    
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs) -> InMemoryCursor:
+        return InMemoryCursor(self, self.match(query))
+
+class InMemoryDatabase:
+    def __init__(self):
+        self.collections: Dict[str, InMemoryCollection] = {}
+    
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self.collections.setdefault(name, InMemoryCollection())
+    
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+class InMemoryMongoClient:
+    """Client MongoDB simulé (bases et collections créées à la demande)"""
+    
+    def __init__(self):
+        self.databases: Dict[str, InMemoryDatabase] = {}
+    
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        return self.databases.setdefault(name, InMemoryDatabase())
+    
+    def __getattr__(self, name: str) -> InMemoryDatabase:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+    
+    def close(self):
+        pass
+
+class InMemoryPipeline:
+    def __init__(self, redis_client: 'InMemoryRedis'):
+        self.redis_client = redis_client
+        self.commands = []
+    
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+    
+    def execute(self) -> List:
+        results = [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+class InMemoryPubSub:
+    """Abonnement pub/sub simulé (messages en file, get_message avec délai)"""
+    
+    def __init__(self, redis_client: 'InMemoryRedis', ignore_subscribe_messages: bool = False):
+        self.redis_client = redis_client
+        self.ignore_subscribe_messages = ignore_subscribe_messages
+        self.channels = set()
+        self.messages = queue.Queue()
+    
+    def subscribe(self, *channels: str):
+        with self.redis_client.lock:
+            for channel in channels:
+                self.channels.add(channel)
+                self.redis_client.subscribers.setdefault(channel, set()).add(self)
+                if not self.ignore_subscribe_messages:
+                    self.messages.put({'type': 'subscribe', 'pattern': None, 'channel': channel.encode(),
+                                       'data': len(self.channels)})
+    
+    def unsubscribe(self, *channels: str):
+        with self.redis_client.lock:
+            for channel in channels or list(self.channels):
+                self.channels.discard(channel)
+                self.redis_client.subscribers.get(channel, set()).discard(self)
+    
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[Dict]:
+        try:
+            return self.messages.get(timeout=timeout) if timeout else self.messages.get_nowait()
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        self.unsubscribe()
+
+class InMemoryRedis:
+    """Redis simulé : chaînes et ensembles avec expiration, pipelines, pub/sub"""
+    
+    def __init__(self):
+        self.data: Dict[str, object] = {}
+        self.expires: Dict[str, float] = {}
+        self.subscribers: Dict[str, set] = {}
+        self.lock = threading.Lock()
+    
+    def _alive(self, key: str) -> bool:
+        if key in self.expires and self.expires[key] <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+    
+    def _encode(self, value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data[key] if self._alive(key) else None
+    
+    def set(self, key: str, value, ex: Optional[int] = None) -> bool:
+        self.data[key] = self._encode(value)
+        self.expires.pop(key, None)
+        if ex:
+            self.expires[key] = time.time() + ex
+        return True
+    
+    def setex(self, key: str, seconds: int, value) -> bool:
+        return self.set(key, value, ex=seconds)
+    
+    def expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self.expires[key] = time.time() + seconds
+        return True
+    
+    def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+    
+    def sadd(self, key: str, *members) -> int:
+        members = {self._encode(m) for m in members}
+        current = self.data[key] if self._alive(key) else set()
+        added = len(members - current)
+        self.data[key] = current | members
+        return added
+    
+    def srem(self, key: str, *members) -> int:
+        if not self._alive(key):
+            return 0
+        members = {self._encode(m) for m in members}
+        removed = len(self.data[key] & members)
+        self.data[key] -= members
+        return removed
+    
+    def smembers(self, key: str) -> set:
+        return set(self.data[key]) if self._alive(key) else set()
+    
+    def pipeline(self) -> InMemoryPipeline:
+        return InMemoryPipeline(self)
+    
+    def flushall(self) -> bool:
+        self.data.clear()
+        self.expires.clear()
+        return True
+    
+    def ping(self) -> bool:
+        return True
+    
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> InMemoryPubSub:
+        return InMemoryPubSub(self, ignore_subscribe_messages)
+    
+    def publish(self, channel: str, message) -> int:
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.messages.put({'type': 'message', 'pattern': None, 'channel': channel.encode(),
+                                     'data': self._encode(message)})
+        return len(subscribers)
+
+def summarize_durations(durations: List[float], items_per_call: int) -> Dict:
+    """Latences (ms) et débit (éléments/s) d'une série de mesures"""
+    durations = np.asarray(durations)
+    return {
+        'calls': len(durations),
+        'items_per_call': items_per_call,
+        'mean_ms': round(float(durations.mean()) * 1000, 3),
+        'p50_ms': round(float(np.percentile(durations, 50)) * 1000, 3),
+        'p95_ms': round(float(np.percentile(durations, 95)) * 1000, 3),
+        'p99_ms': round(float(np.percentile(durations, 99)) * 1000, 3),
+        'max_ms': round(float(durations.max()) * 1000, 3),
+        'throughput_per_s': round(items_per_call * len(durations) / max(float(durations.sum()), 1e-12), 1)
+    }
+
+def measure(fn: Callable[[], object], repeats: int, setup: Optional[Callable[[], None]] = None) -> List[float]:
+    durations = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def traced_peak_mb(fn: Callable[[], object], setup: Optional[Callable[[], None]] = None) -> float:
+    """Pic d'allocation (Python et NumPy) pendant un appel, en Mo"""
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+    finally:
+        tracemalloc.stop()
+
+def max_rss_mb() -> float:
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    scale = 1e6 if sys.platform == 'darwin' else 1e3
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+def build_service(incidents: Dict[str, np.ndarray], workdir: str) -> DisasterAIService:
+    """Créer un service IA sur MongoDB/Redis simulés, modèles écrits dans workdir"""
+    mongo_client = InMemoryMongoClient()
+    mongo_client.disaster_db.incidents.insert_columns(incidents)
+    os.chdir(workdir)
+    return DisasterAIService(mongo_client=mongo_client, redis_client=InMemoryRedis(), start_background=False)
+
+def benchmark_size(size: int, args) -> List[Dict]:
+    """Exécuter les mesures pour un volume d'incidents"""
+    results = []
+    rng = np.random.default_rng(args.seed + 1)
+    
+    started = time.perf_counter()
+    incidents = generate_incidents(size, seed=args.seed)
+    logger.info(f"{size} incidents générés en {time.perf_counter() - started:.2f}s")
+    
+    def record(name: str, durations: List[float], items: int, fn=None, setup=None, **extra):
+        result = {'benchmark': name, 'size': size, **summarize_durations(durations, items), **extra}
+        if args.memory and fn is not None:
+            result['peak_traced_mb'] = traced_peak_mb(fn, setup)
+        result['max_rss_mb'] = max_rss_mb()
+        results.append(result)
+        logger.info(f"{name} (n={size}): p50 {result['p50_ms']} ms, {result['throughput_per_s']} éléments/s")
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='ai-bench-') as workdir:
+        try:
+            service = build_service(incidents, workdir)
+            
+            # Entraînement complet (lecture, index spatial, modèles, sauvegarde)
+            durations = measure(service.train_models, args.train_repeats)
+            record('train_models', durations, size, service.train_models)
+            
+            # Lecture de l'historique
+            durations = measure(service.fetch_historical_data, args.repeats)
+            record('fetch_historical_data', durations, size, service.fetch_historical_data)
+            
+            # Détection d'anomalies sur des lots au format de l'API
+            batch_size = min(args.batch_size, size)
+            batches = [incidents_to_records(incidents, rng.integers(0, size, batch_size))
+                       for _ in range(min(args.repeats, 10))]
+            calls = iter(range(args.repeats * 2))
+            
+            def detect():
+                service.detect_anomalies(IncidentBatch.from_records(batches[next(calls) % len(batches)]))
+            
+            durations = measure(detect, args.repeats)
+            record('detect_anomalies', durations, batch_size, detect)
+            
+            # Zones à risque sans cache (emprise de 0.5° autour d'une ville)
+            def random_bounds() -> Dict:
+                lat, lng = MAJOR_CITIES[rng.integers(len(MAJOR_CITIES)), :2] + rng.normal(0, 0.05, 2)
+                return {'lat_min': lat - 0.25, 'lat_max': lat + 0.25, 'lng_min': lng - 0.25, 'lng_max': lng + 0.25}
+            
+            def clear_cache():
+                service.prediction_cache.entries.clear()
+                service.redis_client.flushall()
+            
+            points = args.grid_resolution ** 2
+            predict = lambda: service.predict_risk_zones(random_bounds(), args.grid_resolution)
+            durations = measure(predict, args.repeats, setup=clear_cache)
+            record('predict_risk_zones', durations, points, predict, clear_cache,
+                   grid_resolution=args.grid_resolution)
+            
+            # Zones à risque servies par le cache
+            bounds = random_bounds()
+            service.predict_risk_zones(bounds, args.grid_resolution)
+            cached = lambda: service.predict_risk_zones(bounds, args.grid_resolution)
+            durations = measure(cached, args.repeats)
+            record('predict_risk_zones_cached', durations, points, grid_resolution=args.grid_resolution)
+            
+            # Zones à risque sous échéance (grille grossière raffinée tant que le temps le permet)
+            resolution = args.deadline_grid_resolution
+            within = lambda: service.predict_risk_zones_within(random_bounds(), resolution, args.deadline_ms)
+            durations = measure(within, args.repeats, setup=clear_cache)
+            record('predict_risk_zones_deadline', durations, resolution ** 2, within, clear_cache,
+                   grid_resolution=resolution, deadline_ms=args.deadline_ms)
+            
+            # Clustering d'un instantané national (incidents les plus récents)
+            snapshot = service.fetch_historical_data()
+            snapshot = snapshot.take(np.argsort(snapshot.timestamps)[-min(size, args.cluster_limit):])
+            cluster = lambda: service.perform_clustering(snapshot)
+            durations = measure(cluster, args.cluster_repeats)
+            record('perform_clustering', durations, len(snapshot), cluster)
+            
+            # Consommateur Redis : débit et latence réception -> publication des anomalies
+            results.append(benchmark_consumer(service, incidents, rng, args))
+        finally:
+            os.chdir(cwd)
+    
+    return results
+
+def benchmark_consumer(service: DisasterAIService, incidents: Dict[str, np.ndarray],
+                       rng: np.random.Generator, args) -> Dict:
+    """Publier des événements 'incident.created' et mesurer leur notation en micro-lots"""
+    size = len(incidents['latitudes'])
+    events = incidents_to_events(incidents, rng.integers(0, size, args.consumer_events))
+    consumer = service.incident_consumer
+    consumer.batch_size = args.consumer_batch_size
+    consumer.max_delay = args.consumer_max_delay_ms / 1000
+    
+    consumer.start()
+    while not service.redis_client.subscribers.get(consumer.input_channel):
+        time.sleep(0.001)
+    
+    started = time.perf_counter()
+    for event in events:
+        service.redis_client.publish(consumer.input_channel, event)
+    while consumer.stats['scored'] + consumer.stats['unscored'] + consumer.stats['invalid'] < len(events):
+        if time.perf_counter() - started > 300:
+            raise TimeoutError("Événements non traités par le consommateur")
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    consumer.stop()
+    
+    stats = consumer.describe()
+    result = {
+        'benchmark': 'incident_consumer',
+        'size': size,
+        'events': len(events),
+        'batch_size': consumer.batch_size,
+        'max_delay_ms': args.consumer_max_delay_ms,
+        'batches': stats['batches'],
+        'anomalies': stats['anomalies'],
+        'throughput_per_s': round(len(events) / elapsed, 1),
+        'p50_ms': stats['latency_p50_ms'],
+        'p95_ms': stats['latency_p95_ms'],
+        'p99_ms': stats['latency_p99_ms'],
+        'max_rss_mb': max_rss_mb()
+    }
+    logger.info(f"incident_consumer (n={size}): p50 {result['p50_ms']} ms, {result['throughput_per_s']} événements/s")
+    return result
+
+def environment() -> Dict:
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scikit_learn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Banc d'essai du service IA")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                        help="Volumes d'incidents historiques (séparés par des virgules)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=20, help="Mesures par opération")
+    parser.add_argument('--train-repeats', type=int, default=3)
+    parser.add_argument('--cluster-repeats', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=1000, help="Incidents par appel de detect_anomalies")
+    parser.add_argument('--grid-resolution', type=int, default=20)
+    parser.add_argument('--deadline-ms', type=float, default=100, help="Échéance des zones à risque progressives")
+    parser.add_argument('--deadline-grid-resolution', type=int, default=200)
+    parser.add_argument('--cluster-limit', type=int, default=100000,
+                        help="Taille maximale de l'instantané soumis au clustering")
+    parser.add_argument('--consumer-events', type=int, default=10000,
+                        help="Événements publiés pour le banc du consommateur Redis")
+    parser.add_argument('--consumer-batch-size', type=int, default=100)
+    parser.add_argument('--consumer-max-delay-ms', type=float, default=200)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Ne pas mesurer le pic d'allocation (tracemalloc)")
+    parser.add_argument('--output', help="Fichier JSON de sortie (sortie standard par défaut)")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger(ai_service.__name__).setLevel(logging.WARNING)
+    
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    report = {
+        'environment': environment(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': []
+    }
+    for size in sizes:
+        report['results'].extend(benchmark_size(size, args))
+        gc.collect()
+    
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+    return report
+
+if __name__ == '__main__':
+    main()
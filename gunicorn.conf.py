@@ -0,0 +1,33 @@
+"""
+Configuration gunicorn du service IA
+Modèles chargés une fois dans le processus maître, un worker par cœur
+"""
+
+import multiprocessing
+import os
+
+# Une seule thread de calcul numérique par worker : les workers occupent déjà tous les cœurs
+for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, '1')
+
+wsgi_app = 'ai_service:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', '3007')}"
+workers = int(os.getenv('AI_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('AI_WORKER_THREADS', '4'))
+timeout = 120
+
+# Charger l'application (modèles, raster, index spatial) avant le fork des workers
+preload_app = True
+
+
+def _service(server):
+    return server.app.wsgi().extensions['disaster_ai']
+
+
+def pre_fork(server, worker):
+    _service(server).before_fork()
+
+
+def post_fork(server, worker):
+    _service(server).after_fork()